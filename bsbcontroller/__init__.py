@@ -1,3 +1,6 @@
 from .controller import Bsb
+from .request import Priority, RequestError, SendError, NoAnswerError, RejectedError
+from .breaker import CircuitOpenError
+from .aio import AsyncBsb
 
-__all__ = ["Bsb"]
+__all__ = ["Bsb", "AsyncBsb", "Priority", "RequestError", "SendError", "NoAnswerError", "RejectedError", "CircuitOpenError"]
@@ -1,8 +1,10 @@
 import argparse
+from typing import Any
 from .server import run
-from .messages import messages_by_name
+from .messages import messages_by_name, catalog
+from .scheduler import AdaptiveInterval
 
-from schema import Schema, Or, Optional
+from schema import Schema, Or, And, Optional
 import yaml
 
 
@@ -15,37 +17,116 @@ def parse_args() -> argparse.Namespace:
     return args
 
 
-config_schema = Schema(
-    {
-        'bsbport': str,
-        Optional('mqtt'): {
-            'connection': {
-                'addr': str,
-                'port': int,
+def config_schema() -> Schema:
+    # Built after the catalog is loaded, so the extra messages are accepted
+    name: Any = And(str, messages_by_name.__contains__, error="Unknown message name")
+    seconds: Any = And(Or(int, float), lambda x: x > 0)
+    adaptive: Any = And(
+        {
+            'min': seconds,
+            'max': seconds,
+            Optional('threshold'): Or(int, float),
+            Optional('trigger'): name,
+            Optional('active'): [object],
+        },
+        lambda d: d['min'] <= d['max'],
+        lambda d: ('trigger' in d) == ('active' in d),
+    )
+
+    return Schema(
+        {
+            'bsbport': str,
+            Optional('catalog'): str,
+            Optional('mqtt'): {
+                'connection': {
+                    'addr': str,
+                    'port': int,
+                },
+                Optional('allow_set'): [
+                    name,
+                ],
+                Optional('rename'): {
+                    name: str,
+                },
+                Optional('publish'): {
+                    Optional('interval'): And(Or(int, float), lambda x: x >= 0),
+                    Optional('batch'): And(int, lambda x: x >= 1),
+                },
+                Optional('qos'): {
+                    name: And(int, lambda x: x in (0, 1, 2)),
+                },
+            },
+            Optional('bus'): {
+                Optional('window'): And(int, lambda x: x >= 1),
+                Optional('answer_timeout'): And(Or(int, float), lambda x: x > 0),
+                Optional('tx'): {
+                    Optional('retries'): And(int, lambda x: x >= 1),
+                    Optional('idle_timeout'): And(Or(int, float), lambda x: x > 0),
+                    Optional('echo_margin'): And(Or(int, float), lambda x: x >= 0),
+                    Optional('backoff_base'): And(Or(int, float), lambda x: x >= 0),
+                    Optional('backoff_max'): And(Or(int, float), lambda x: x >= 0),
+                    Optional('deadline'): And(Or(int, float), lambda x: x > 0),
+                },
+            },
+            Optional('breaker'): {
+                Optional('threshold'): And(int, lambda x: x >= 1),
+                Optional('backoff'): seconds,
+                Optional('backoff_max'): seconds,
+            },
+            Optional('refresh'): {
+                Optional('max_duty'): And(Or(int, float), lambda x: 0 < x <= 1),
+                Optional('jitter'): And(Or(int, float), lambda x: 0 <= x < 1),
+                Optional('passive'): bool,
+            },
+            Optional('derive'): {
+                name: And(str, lambda s: s.split(".", 1)[0] in messages_by_name and "." in s, error="Expected source_message.field"),
+            },
+            # Empty disables the default reactions
+            Optional('react'): {
+                Optional(name): {
+                    name: And(Or(int, float), lambda x: x >= 0),
+                },
             },
-            Optional('allow_set'): [
-                *messages_by_name.keys(),
+            Optional('dedup'): {
+                Optional('window'): And(Or(int, float), lambda x: x >= 0),
+                Optional('heartbeat'): seconds,
+                Optional('messages'): {
+                    name: And(Or(int, float), lambda x: x >= 0),
+                },
+            },
+            Optional('cache'): {
+                Optional('max_age'): Or(int, float),
+                Optional('messages'): {
+                    name: Or(int, float),
+                },
+            },
+            'requests': [
+                Or(
+                    name,
+                    And({name: Or(int, adaptive)}, lambda d: len(d) == 1),
+                )
             ],
-            Optional('rename'): {
-                Or(*messages_by_name.keys()): str,
-            }
-        },
-        'requests': [
-            Or(
-                *messages_by_name.keys(),
-                {Or(*messages_by_name.keys(), only_one=True): int},
-            )
-        ],
-    }
-)
+        }
+    )
+
 
 args = parse_args()
 
 with open(args.config) as f:
     config = yaml.safe_load(f)
-config_schema.validate(config)
+if isinstance(config, dict) and config.get('catalog'):
+    catalog.load_file(config['catalog'])
+config_schema().validate(config)
+
+
+def interval(v: Any) -> int | AdaptiveInterval | None:
+    if not isinstance(v, dict):
+        return v
+    trigger = v.get('trigger')
+    return AdaptiveInterval(v['min'], v['max'], v.get('threshold', 0.), messages_by_name[trigger] if trigger else None, tuple(v.get('active', ())))
+
 
 requests = {(list(k.keys())[0] if isinstance(k, dict) else k): (list(k.values())[0] if isinstance(k, dict) else None) for k in config['requests']}
-monitored_messages = {messages_by_name[k]: v for k, v in requests.items()}
+monitored_messages = {messages_by_name[k]: interval(v) for k, v in requests.items()}
 
 run(config, monitored_messages)
@@ -0,0 +1,110 @@
+import abc
+import asyncio
+from typing import Any, Generic, Optional, TypeVar
+from collections.abc import Callable, Iterable
+
+from .controller import Bsb
+from .request import Priority
+from .telegram import Telegram, Command
+
+
+T = TypeVar("T")
+
+
+class Stream(abc.ABC, Generic[T]):
+    """ Items from the controller thread buffered for one asyncio consumer
+
+    The buffer is bounded, when the consumer lags the oldest items are dropped
+    (and counted). Must be created in the event loop, close it when done:
+
+        async with abus.values() as values:
+            async for name, value in values:
+                ...
+    """
+    def __init__(self, listeners: list[Callable[..., None]], maxsize: int = 100):
+        self.dropped = 0
+
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[T] = asyncio.Queue(maxsize)
+        self._listeners = listeners
+        listeners.append(self._listener)
+
+    @abc.abstractmethod
+    def _listener(self, *args: Any) -> None:
+        """ Called from the controller threads with the event, pushes the item """
+
+    def _push(self, item: T) -> None:
+        # Called from the controller threads
+        try:
+            self._loop.call_soon_threadsafe(self._put, item)
+        except RuntimeError:
+            # Event loop closed
+            self.close()
+
+    def _put(self, item: T) -> None:
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    def close(self) -> None:
+        try:
+            self._listeners.remove(self._listener)
+        except ValueError:
+            pass
+
+    def __aiter__(self) -> "Stream[T]":
+        return self
+
+    async def __anext__(self) -> T:
+        return await self._queue.get()
+
+    async def __aenter__(self) -> "Stream[T]":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.close()
+
+
+class TelegramStream(Stream[Telegram]):
+    def __init__(self, bsb: Bsb, maxsize: int = 100):
+        super().__init__(bsb.loggers, maxsize)
+
+    def _listener(self, telegram: Telegram) -> None:
+        self._push(telegram)
+
+
+class ValueStream(Stream[tuple[str, Any]]):
+    def __init__(self, bsb: Bsb, names: Optional[Iterable[str]] = None, maxsize: int = 100):
+        self._names = None if names is None else frozenset(names)
+        super().__init__(bsb.callbacks, maxsize)
+
+    def _listener(self, name: str, value: Any) -> None:
+        if self._names is None or name in self._names:
+            self._push((name, value))
+
+
+class AsyncBsb(object):
+    """ asyncio interface of a running Bsb controller
+
+    Requests are queued to the controller and awaited through their futures,
+    no thread is held per caller.
+    """
+    def __init__(self, bsb: Bsb):
+        self.bsb = bsb
+
+    async def get_value(self, req: str, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None, priority: Priority = Priority.GET, max_age: Optional[float] = None) -> Any:
+        future = self.bsb.get_value_async(req, src, timeout, priority, max_age)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    async def set_value(self, req: str, value: Any, cmd: Command = Command.SET, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None) -> Any:
+        future = self.bsb.set_value_async(req, value, cmd, src, timeout)
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+    def telegrams(self, maxsize: int = 100) -> TelegramStream:
+        """ All telegrams sent and received on the bus """
+        return TelegramStream(self.bsb, maxsize)
+
+    def values(self, names: Optional[Iterable[str]] = None, maxsize: int = 100) -> ValueStream:
+        """ (name, value) of the values read, set or derived, optionally only of the given messages """
+        return ValueStream(self.bsb, names, maxsize)
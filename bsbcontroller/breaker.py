@@ -0,0 +1,94 @@
+import enum
+import time
+from typing import Any, Optional
+from dataclasses import dataclass
+
+from .telegram import Message
+from .request import RequestError
+
+
+class CircuitOpenError(RequestError):
+    """ The message failed repeatedly and is not read over BSB until the next probe """
+
+
+class State(enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+
+@dataclass
+class Circuit:
+    state: State = State.CLOSED
+    failures: int = 0
+    # Number of times opened in a row, the open time doubles each time
+    opened: int = 0
+    retry_at: float = 0.
+    error: str = ""
+
+
+class CircuitBreaker(object):
+    """ Failures of reads per message
+
+    After threshold failures in a row (no answer, NAK, ERR) the circuit of the
+    message opens and it is not read for backoff seconds. Then one read is let
+    through as a probe: success closes the circuit, failure opens it again for
+    twice as long, up to backoff_max.
+    """
+    def __init__(self, threshold: int = 3, backoff: float = 60., backoff_max: float = 3600.):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self._circuits: dict[Message, Circuit] = {}
+
+    def state(self, msg: Message) -> State:
+        circuit = self._circuits.get(msg)
+        return circuit.state if circuit is not None else State.CLOSED
+
+    def retry_at(self, msg: Message) -> Optional[float]:
+        circuit = self._circuits.get(msg)
+        return circuit.retry_at if circuit is not None and circuit.state == State.OPEN else None
+
+    def allow(self, msg: Message, now: Optional[float] = None) -> bool:
+        """ Whether the message can be read now, a read allowed on an open circuit is the probe """
+        circuit = self._circuits.get(msg)
+        if circuit is None or circuit.state == State.CLOSED:
+            return True
+        if circuit.state == State.HALF_OPEN:
+            # The probe is running
+            return False
+
+        if (time.monotonic() if now is None else now) < circuit.retry_at:
+            return False
+        circuit.state = State.HALF_OPEN
+        return True
+
+    def aborted(self, msg: Message) -> None:
+        """ The probe was not sent, the next read probes again """
+        circuit = self._circuits.get(msg)
+        if circuit is not None and circuit.state == State.HALF_OPEN:
+            circuit.state = State.OPEN
+
+    def success(self, msg: Message) -> None:
+        self._circuits.pop(msg, None)
+
+    def failure(self, msg: Message, error: Exception, now: Optional[float] = None) -> None:
+        circuit = self._circuits.setdefault(msg, Circuit())
+        circuit.failures += 1
+        circuit.error = str(error)
+        if circuit.state == State.HALF_OPEN or circuit.failures >= self.threshold:
+            circuit.state = State.OPEN
+            circuit.retry_at = (time.monotonic() if now is None else now) + min(self.backoff_max, self.backoff * 2 ** circuit.opened)
+            circuit.opened += 1
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            msg.name: {
+                "state": circuit.state.value,
+                "failures": circuit.failures,
+                "error": circuit.error,
+                "retry_in": max(0., circuit.retry_at - now) if circuit.state == State.OPEN else None,
+            } for msg, circuit in list(self._circuits.items())
+        }
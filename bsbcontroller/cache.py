@@ -0,0 +1,59 @@
+import time
+import threading
+from typing import Any, Optional
+
+from .telegram import Message
+
+
+class ValueCache(object):
+    """ Last known values of messages with the time they were read
+
+    Readers which accept slightly stale data give a max. age (in seconds),
+    the default can be set per message.
+    """
+    def __init__(self, default_max_age: float = 0.):
+        self.default_max_age = default_max_age
+        self.max_age: dict[Message, float] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._values: dict[Message, tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def max_age_for(self, msg: Message) -> float:
+        return self.max_age.get(msg, self.default_max_age)
+
+    def update(self, msg: Message, value: Any, timestamp: Optional[float] = None) -> None:
+        with self._lock:
+            self._values[msg] = (time.monotonic() if timestamp is None else timestamp, value)
+
+    def invalidate(self, msg: Message) -> None:
+        with self._lock:
+            self._values.pop(msg, None)
+
+    def age(self, msg: Message) -> Optional[float]:
+        item = self._values.get(msg)
+        return time.monotonic() - item[0] if item is not None else None
+
+    def get(self, msg: Message, max_age: Optional[float] = None) -> tuple[bool, Any]:
+        """ Returns (True, value) if there is a value not older than max_age """
+        if max_age is None:
+            max_age = self.max_age_for(msg)
+
+        with self._lock:
+            item = self._values.get(msg)
+            if item is not None and max_age > 0 and time.monotonic() - item[0] <= max_age:
+                self.hits += 1
+                return True, item[1]
+            self.misses += 1
+        return False, None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._values),
+        }
@@ -0,0 +1,175 @@
+import sys
+import inspect
+from array import array
+from typing import Optional, Type, Iterator
+from collections.abc import Iterable, Mapping
+
+from .telegram import Flag, Message
+from .telegram import fields as f
+from .telegram.message import unknown_message
+
+
+# Field types which can be referenced by name in a definition file
+field_types: dict[str, Type[f.Field]] = {
+    name: cls for name, cls in inspect.getmembers(f, inspect.isclass) if issubclass(cls, f.Field) and cls is not f.Field
+}
+
+
+class Catalog(object):
+    """ Message definitions stored in compact arrays, Message objects are built on first use
+
+    Definitions can be loaded from a text file with one message per line:
+
+        # param     flags  type  name
+        0x2d3d051e  FB     Temp  room1_temp
+        0x05000219  -      -     status_hw
+
+    Flags are names from telegram.Flag joined by '|' ('-' for none),
+    type is a class name from telegram.fields ('-' for no value).
+
+    A param received without a definition is looked up by its row
+    (param & 0xffff); of the definitions sharing a row the lowest param wins.
+    """
+    def __init__(self, messages: Iterable[Message] = ()):
+        self._params = array('I')
+        self._flags = array('B')
+        self._types = array('B')
+        self._names: list[str] = []
+        self._type_list: list[Optional[Type[f.Field]]] = [None]
+
+        self._messages: dict[int, Message] = {}
+        self._by_param: dict[int, int] = {}
+        self._by_name: dict[str, int] = {}
+        # Row number (param & 0xffff) -> the lowest param defined with it
+        self._by_row: dict[int, int] = {}
+
+        self.by_id = _ParamIndex(self)
+        self.by_name = _NameIndex(self)
+
+        for msg in messages:
+            self.add(msg.param, msg.flags, msg.fields, msg.name)
+            self._messages[len(self._names) - 1] = msg
+
+    def __len__(self) -> int:
+        return len(self._by_param)
+
+    def add(self, param: int, flags: Flag, fields: Optional[Type[f.Field]], name: str) -> None:
+        try:
+            type_idx = self._type_list.index(fields)
+        except ValueError:
+            type_idx = len(self._type_list)
+            self._type_list.append(fields)
+
+        idx = len(self._names)
+        self._params.append(param)
+        self._flags.append(flags)
+        self._types.append(type_idx)
+        self._names.append(sys.intern(name))
+
+        # Later definitions override the former ones
+        prev = self._by_param.get(param)
+        if prev is not None:
+            self._messages.pop(prev, None)
+        self._by_param[param] = idx
+        self._by_name[name] = idx
+        # Rows are not unique, the choice must not depend on the order of the definitions
+        row = param & 0xFFFF
+        current = self._by_row.get(row)
+        if current is None or param < current:
+            self._by_row[row] = param
+
+    def load_file(self, filename: str) -> None:
+        with open(filename) as file:
+            self.load_lines(file)
+
+    def load_lines(self, lines: Iterable[str]) -> None:
+        for lineno, line in enumerate(lines, 1):
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            try:
+                param, flags, fields, name = line.split()
+                self.add(int(param, 0), self._parse_flags(flags), None if fields == "-" else field_types[fields], name)
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"Catalog: invalid definition on line {lineno}: {line!r}") from e
+
+    @staticmethod
+    def _parse_flags(text: str) -> Flag:
+        flags = Flag.NONE
+        if text != "-":
+            for name in text.split("|"):
+                flags |= Flag[name]
+        return flags
+
+    def _message(self, idx: int) -> Message:
+        msg = self._messages.get(idx)
+        if msg is None:
+            fields = self._type_list[self._types[idx]]
+            msg = Message(self._params[idx], Flag(self._flags[idx]), fields, self._names[idx])
+            self._messages[idx] = msg
+        return msg
+
+    def get(self, param: int) -> Optional[Message]:
+        idx = self._by_param.get(param)
+        return None if idx is None else self._message(idx)
+
+    def get_by_name(self, name: str) -> Optional[Message]:
+        idx = self._by_name.get(name)
+        return None if idx is None else self._message(idx)
+
+    def get_by_row(self, param: int) -> Optional[Message]:
+        """ Message with the same row number (param & 0xffff), the one with the lowest param if there are more """
+        row_param = self._by_row.get(param & 0xFFFF)
+        return None if row_param is None else self.get(row_param)
+
+    def lookup(self, param: int) -> Message:
+        """ Exact match, then match by row, then a placeholder 'unknown' message """
+        msg = self.get(param)
+        if msg is None:
+            msg = self.get_by_row(param)
+        if msg is None:
+            msg = unknown_message(param)
+        return msg
+
+
+class _ParamIndex(Mapping[int, Message]):
+    def __init__(self, catalog: Catalog):
+        self._catalog = catalog
+
+    def __getitem__(self, param: int) -> Message:
+        msg = self._catalog.get(param)
+        if msg is None:
+            raise KeyError(param)
+        return msg
+
+    def lookup(self, param: int) -> Message:
+        return self._catalog.lookup(param)
+
+    def __contains__(self, param: object) -> bool:
+        return param in self._catalog._by_param
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._catalog._by_param)
+
+    def __len__(self) -> int:
+        return len(self._catalog._by_param)
+
+
+class _NameIndex(Mapping[str, Message]):
+    def __init__(self, catalog: Catalog):
+        self._catalog = catalog
+
+    def __getitem__(self, name: str) -> Message:
+        msg = self._catalog.get_by_name(name)
+        if msg is None:
+            raise KeyError(name)
+        return msg
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._catalog._by_name
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._catalog._by_name)
+
+    def __len__(self) -> int:
+        return len(self._catalog._by_name)
@@ -1,15 +1,24 @@
 import time
-import queue
 from typing import Optional, Any
 from collections.abc import Callable
 import traceback
 import threading
 import logging
 import concurrent.futures
+from collections import deque
+from functools import partial
 
-from .driver import BsbDriver
+from .driver import BsbDriver, TxPolicy
 from .messages import messages_by_name
 from .telegram import Telegram, Command, Message
+from .transaction import Transaction, TransactionTable
+from .scheduler import RefreshScheduler, AdaptiveInterval
+from .request import Request, RequestQueue, Priority, RequestError, SendError, NoAnswerError, RejectedError
+from .breaker import CircuitBreaker, CircuitOpenError
+from .cache import ValueCache
+from .derive import Derivations
+from .events import EventBus
+from .dedup import DuplicateFilter
 from .utils.testdriver import TestBsbDriver
 
 
@@ -18,20 +27,45 @@ logger = logging.getLogger("BSB")
 
 
 class Bsb():
-    def __init__(self, port: str):
-        self.callbacks: list[Callable[[str, Any], None]] = []
-        self.loggers: list[Callable[[Telegram], None]] = []
-
-        self._drv = TestBsbDriver() if port == "TEST" else BsbDriver(port)
-        self._requests: list[tuple[Message, Optional[Any], bool, dict[str, Any], queue.Queue[Any]]] = []
-        self._mon_requests: dict[Message, int | None] = {}
-        self._mon_refresh: dict[Message, float | None] = {}
+    # Time to wait for an answer to a sent telegram
+    ANSWER_TIMEOUT = 2.0
+    # Max. number of telegrams waiting for an answer at a time
+    WINDOW = 1
+    # Skip a scheduled refresh if the value was read this recently
+    COALESCE_TIME = 1.0
+
+    def __init__(self, port: str, tx_policy: Optional[TxPolicy] = None):
+        # Called with (name, value) of the values read, set or derived
+        self.callbacks = EventBus()
+        # Called with every telegram sent or received
+        self.loggers = EventBus()
+
+        self._drv = TestBsbDriver() if port == "TEST" else BsbDriver(port, tx_policy)
+        self._requests = RequestQueue()
+        # Phase timings of the recent bus transactions
+        self.transactions: deque[Transaction] = deque(maxlen=100)
+        # Sent and not answered yet
+        self.pending = TransactionTable(self.WINDOW, self.ANSWER_TIMEOUT)
+        self.scheduler = RefreshScheduler()
+        # Answers and INFs seen on the bus count as fresh readings and postpone the polls
+        self.passive = False
+        # Values of monitored messages carried by composite broadcasts, they postpone the polls
+        self.derivations = Derivations()
+        # Repeated identical frames are not logged nor passed on to the callbacks
+        self.dedup = DuplicateFilter()
+        # Messages refreshed some time after a telegram of another message is seen: name -> [(delay, target)]
+        self.reactions: dict[str, list[tuple[float, Message]]] = {}
+        self.cache = ValueCache()
+        # Messages failing repeatedly are not read for a while
+        self.breaker = CircuitBreaker()
+        # Reads queued or running, concurrent reads of the same message share them
+        self._inflight: dict[tuple[Message, int], Request] = {}
+        self._inflight_lock = threading.Lock()
 
         self._monitor_thread_event = threading.Event()
         self._monitor_thread = threading.Thread(target=self._monitor)
 
         self._pending_set: dict[tuple[str, int, int], tuple[int | float, Any]] = {}
-        self._tpe = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
     def start(self) -> None:
         self._monitor_thread.start()
@@ -39,57 +73,178 @@ class Bsb():
     def stop(self) -> None:
         self._monitor_thread_event.set()
         self._monitor_thread.join()
+        self.callbacks.stop()
+        self.loggers.stop()
 
-    def get_value(self, req: str, src: int = Telegram.DEF_SRC) -> Any:
-        msg = messages_by_name[req]
-        kwargs = {'src': src}
-        q: queue.Queue[Any] = queue.Queue()
-        self._requests.append((msg, None, False, kwargs, q))
-        val = q.get()
-        return val
+    def get_value_async(self, req: str, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None, priority: Priority = Priority.GET, max_age: Optional[float] = None) -> concurrent.futures.Future[Any]:
+        """ Queue a read of the value, the future resolves to the value read
 
-    def set_value(self, req: str, value: Any, cmd: Command = Command.SET, src: int = Telegram.DEF_SRC) -> None:
+        A cached value not older than max_age (default per message, see ValueCache)
+        is returned without a bus transaction. Concurrent reads of the same message
+        are served by one transaction, at the highest priority of its callers.
+        """
+        msg = messages_by_name[req]
+        hit, value = self.cache.get(msg, max_age)
+        if hit:
+            future: concurrent.futures.Future[Any] = concurrent.futures.Future()
+            future.set_result(value)
+            return future
+
+        request, new = self._shared_read(msg, src, priority, timeout)
+        if new:
+            self._requests.put(request)
+        else:
+            # Don't make an urgent caller wait behind the refreshes
+            self._requests.promote(request, priority)
+        return self._follow(request.future)
+
+    def _shared_read(self, msg: Message, src: int, priority: Priority, timeout: Optional[float] = None) -> tuple[Request, bool]:
+        """ The read of the message queued or on the bus, or a new one (then True) which the others will join """
+        key = (msg, src)
+        with self._inflight_lock:
+            request = self._inflight.get(key)
+            if request is not None:
+                self.cache.coalesced += 1
+                return request, False
+            request = self._inflight[key] = Request(msg, None, False, {'src': src}, priority, timeout)
+            request.future.add_done_callback(partial(self._inflight_done, key))
+        return request, True
+
+    def _inflight_done(self, key: tuple[Message, int], future: concurrent.futures.Future[Any]) -> None:
+        with self._inflight_lock:
+            request = self._inflight.get(key)
+            if request is not None and request.future is future:
+                del self._inflight[key]
+
+    @staticmethod
+    def _follow(shared: concurrent.futures.Future[Any]) -> concurrent.futures.Future[Any]:
+        # Every caller gets its own future, so cancelling it doesn't affect the others
+        future: concurrent.futures.Future[Any] = concurrent.futures.Future()
+
+        def done(f: concurrent.futures.Future[Any]) -> None:
+            try:
+                if f.cancelled():
+                    future.cancel()
+                elif f.exception() is not None:
+                    future.set_exception(f.exception())
+                else:
+                    future.set_result(f.result())
+            except concurrent.futures.InvalidStateError:
+                pass # Cancelled by the caller
+        shared.add_done_callback(done)
+        return future
+
+    def set_value_async(self, req: str, value: Any, cmd: Command = Command.SET, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None, priority: Priority = Priority.SET) -> concurrent.futures.Future[Any]:
+        """ Queue a write of the value, the future resolves to True if the write was acknowledged """
         msg = messages_by_name[req]
-        kwargs = {'src': src, 'cmd': cmd}
-        q: queue.Queue[Any] = queue.Queue()
-        self._requests.append((msg, value, True, kwargs, q))
-        v = q.get()
-        if isinstance(v, Exception):
-            raise v
+        request = Request(msg, value, True, {'src': src, 'cmd': cmd}, priority, timeout)
+        self._requests.put(request)
+        return request.future
+
+    @staticmethod
+    def _result(future: concurrent.futures.Future[Any], timeout: Optional[float]) -> Any:
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Don't let it run later if still waiting in the queue
+            future.cancel()
+            raise
+
+    def get_value(self, req: str, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None, max_age: Optional[float] = None) -> Any:
+        return self._result(self.get_value_async(req, src, timeout, max_age=max_age), timeout)
+
+    def set_value(self, req: str, value: Any, cmd: Command = Command.SET, src: int = Telegram.DEF_SRC, timeout: Optional[float] = None) -> None:
+        self._result(self.set_value_async(req, value, cmd, src, timeout), timeout)
+
+    def add_reaction(self, trigger: str, target: str, delay: float) -> None:
+        """ Refresh target delay seconds after a telegram of trigger is seen on the bus """
+        self.reactions.setdefault(messages_by_name[trigger].name, []).append((delay, messages_by_name[target]))
 
-    def set_monitored(self, monitor: dict[Message, int | None]) -> None:
-        self._mon_requests = {}
-        self._mon_requests.update(monitor)
+    def set_monitored(self, monitor: dict[Message, int | AdaptiveInterval | None]) -> None:
+        self.scheduler.set_monitored(monitor, time.monotonic())
 
     def _monitor(self) -> None:
         while not self._monitor_thread_event.is_set():
             try:
                 telegram = self._get_telegram()
-                if not self._handle_requests() and telegram is None:
-                    time.sleep(0.1)
-                self._refresh()
+                busy = self._handle_requests()
+                busy |= self._refresh()
+                self._expire()
+                if not busy and telegram is None:
+                    # Idle: block until a frame arrives, a short while passes, a refresh is due or an answer times out
+                    now = time.monotonic()
+                    deadline = now + 0.1
+                    # A due refresh can't start while the window is full, wait for an answer instead
+                    due = self.scheduler.next_due(now) if not self.pending.full else None
+                    for t in (due, self.pending.next_deadline()):
+                        if t is not None:
+                            deadline = min(deadline, t)
+                    # A request queued meanwhile can start unless the window is full
+                    self._get_telegram(deadline=deadline, wake=self._requests.ready if not self.pending.full else None)
                 self._clean_pending_timeout()
             except Exception as e:
                 logger.warn("monitor thread: " + str(e))
                 logger.warn(traceback.format_exc())
 
-    def _log(self, telegram: Telegram) -> None:
+    def _log(self, telegram: Telegram, answered: bool = False, duplicate: bool = False) -> None:
+        """ answered: the telegram answers our transaction, its value is handled by the transaction
+        duplicate: a repeated frame, it still refreshes the cache and the scheduler but is not passed on
+        """
         key = (telegram.name, telegram.src, telegram.dst)
-        val = (time.time(), telegram.value)
+
+        reactions = self.reactions.get(telegram.name)
+        if reactions and telegram.cmd != Command.QUR:
+            self._react(reactions)
+
+        if telegram.cmd in [Command.ANS, Command.INF]:
+            if self.passive and not answered:
+                self._observe(telegram)
+            self._derive(telegram, not duplicate)
+
+        if duplicate:
+            return
 
         if telegram.cmd == Command.SET:
-            self._pending_set.update({key: val})
+            # Decoded only here, the other frames are decoded when somebody reads the value
+            self._pending_set.update({key: (time.time(), telegram.value)})
 
         if telegram.cmd == Command.ACK:
             set_key = (telegram.name, telegram.dst, telegram.src)
             set_value = self._pending_set.get(set_key, None)
             if set_value:
                 del self._pending_set[set_key]
-                for cb_c in self.callbacks:
-                    self._tpe.submit(cb_c, set_key[0], set_value[1])
-
-        for cb_l in self.loggers:
-            self._tpe.submit(cb_l, telegram)
+                self.callbacks.publish(set_key[0], set_value[1])
+
+        self.loggers.publish(telegram)
+
+    def _observe(self, telegram: Telegram) -> None:
+        msg = telegram.msg
+        now = time.monotonic()
+        # Trigger messages of adaptive intervals need not be monitored
+        self.scheduler.update(msg, telegram.value, now)
+        if msg not in self.scheduler:
+            return
+
+        self.cache.update(msg, telegram.value, now)
+        if self.scheduler.observed(msg, now):
+            logger.debug(f"passive: {msg.name} seen on the bus, poll postponed")
+
+    def _react(self, reactions: list[tuple[float, Message]]) -> None:
+        # Polled by the monitor thread when due, repeated triggers don't add more polls
+        now = time.monotonic()
+        for delay, msg in reactions:
+            if self.scheduler.poll_at(msg, now + delay):
+                logger.debug(f"react: {msg.name} refresh in {delay}s")
+
+    def _derive(self, telegram: Telegram, publish: bool = True) -> None:
+        for msg, value in self.derivations.derive(telegram):
+            now = time.monotonic()
+            self.cache.update(msg, value, now)
+            self.scheduler.update(msg, value, now)
+            if self.scheduler.observed(msg, now):
+                logger.debug(f"derived: {msg.name} from {telegram.name}, poll postponed")
+            if publish:
+                self.callbacks.publish(msg.name, value)
 
     def _clean_pending_timeout(self) -> None:
         clear = []
@@ -101,118 +256,189 @@ class Bsb():
         for item in clear:
             del self._pending_set[item]
 
-    def _flush_input(self) -> None:
-        while True:
-            telegram = self._get_telegram(wait=True)
-            if not telegram:
-                break
+    def _send_telegram(self, telegram: Telegram, tr: Optional[Transaction] = None) -> bool:
+        if tr is not None:
+            tr.start()
 
-    def _send_telegram(self, telegram: Telegram) -> bool:
-        self._flush_input()
+        if not self._drv.send_telegram(telegram):
+            return False
 
-        if self._drv.send_telegram(telegram):
-            self._log(telegram)
-            return True
-        return False
+        if tr is not None:
+            last_tx = self._drv.last_tx
+            tr.transmitted(last_tx[-1].transmit if last_tx else 0.)
+        self._log(telegram)
+        return True
 
-    def _get_telegram(self, wait: bool = True) -> Optional[Telegram]:
-        telegram = self._drv.receive_telegram(wait)
+    def _get_telegram(self, wait: bool = True, deadline: Optional[float] = None, wake: Optional[threading.Event] = None) -> Optional[Telegram]:
+        telegram = self._drv.receive_telegram(wait, deadline, wake)
 
         if telegram:
-            self._log(telegram)
+            tr = self.pending.resolve(telegram)
+            # Answers to our transactions are never suppressed
+            duplicate = tr is None and self.dedup.duplicate(telegram, time.monotonic())
+            self._log(telegram, tr is not None, duplicate)
+            if tr is not None:
+                self._finish_transaction(tr)
 
         return telegram
 
-    def _get_value(self, msg: Message, src: int = Telegram.DEF_SRC) -> Any:
+    def _expire(self) -> None:
+        for tr in self.pending.expire(time.monotonic()):
+            self._finish_transaction(tr)
+
+    def _finish_transaction(self, tr: Transaction) -> None:
+        self.transactions.append(tr)
+        logger.debug(f"transaction: {tr}")
+        if tr.done is not None:
+            tr.done(tr)
+
+    def _start_query(self, msg: Message, done: Callable[[Transaction], None], src: int = Telegram.DEF_SRC, queued: Optional[float] = None) -> None:
         get = Telegram(msg, src=src)
-        if not self._send_telegram(get):
-            logger.warn(f"get_value: Can't send telegram: {get}")
-            raise Exception
-
-        timeout = 0
-        ret = self._get_telegram()
-        while ret is None or ret.msg.param != get.msg.param:
-            ret = self._get_telegram()
-            time.sleep(0.1)
-            timeout += 1
-            if timeout >= 10:
-                logger.error(f"get_value: timeout: {get}")
-                raise Exception
-
-        return ret.value
-
-    def _set_value(self, msg: Message, value: Any, cmd: Command = Command.SET, src: int = Telegram.DEF_SRC) -> bool:
+        tr = Transaction(msg, get.cmd, time.monotonic() if queued is None else queued, done=done)
+        if not self._send_telegram(get, tr):
+            # Not the message's fault
+            self.breaker.aborted(msg)
+            raise SendError(f"{msg.name}: can't send telegram")
+
+        self.pending.add(tr, get)
+
+    def _answer_value(self, tr: Transaction) -> Any:
+        """ Value answered to a query, the failures count towards opening the circuit """
+        msg, answer = tr.msg, tr.answer
+        error: RequestError
+        if answer is None:
+            error = NoAnswerError(f"{msg.name}: no answer")
+        elif answer.cmd not in (Command.ANS, Command.INF):
+            error = RejectedError(f"{msg.name}: {Command(answer.cmd).name}")
+        else:
+            self.breaker.success(msg)
+            return answer.value
+
+        self.breaker.failure(msg, error, tr.answered)
+        raise error
+
+    def _postpone_open(self, msg: Message) -> None:
+        retry_at = self.breaker.retry_at(msg)
+        if retry_at is not None:
+            self.scheduler.postpone(msg, retry_at)
+
+    def _start_set(self, msg: Message, value: Any, done: Callable[[Transaction], None], cmd: Command = Command.SET, src: int = Telegram.DEF_SRC, queued: Optional[float] = None) -> bool:
         telegram = Telegram(msg, cmd=cmd, src=src)
         if not telegram.set_value(value):
             return False
 
-        ret = self._send_telegram(telegram)
-        if not ret:
+        tr = Transaction(msg, telegram.cmd, time.monotonic() if queued is None else queued, done=done)
+        if not self._send_telegram(telegram, tr):
             return False
 
         if telegram.cmd == Command.INF:
-            return True
-
-        timeout = 0
-        t = self._get_telegram()
-        while (t is None or t.msg.param != msg.param) and timeout < 10:
-            if t:
-                logger.info(f"set_value: another telegram received: {t}")
-            # TODO: Timeout
-            t = self._get_telegram()
-            time.sleep(0.1)
-            timeout += 1
-        if timeout == 10:
-            logger.error(f"set_value: timeout: {t}")
+            # Not answered
+            self._finish_transaction(tr)
+        else:
+            self.pending.add(tr, telegram)
         return True
 
     def _handle_requests(self) -> bool:
-        if not self._requests:
-            return False
-
-        while self._requests:
-            try:
-                msg, value, do_set, kwargs, q = self._requests.pop()
-            except Exception as e:
-                logger.warn("handle request GET: " + str(e))
-                logger.warn(traceback.format_exc())
-                continue
-
+        # Started before every refresh item, the most important request first
+        handled = False
+        while not self.pending.full and (request := self._requests.get()) is not None:
+            handled = True
+            msg = request.msg
+            done = partial(self._request_done, request)
             try:
-                if do_set:
-                    self._set_value(msg, value, **kwargs)
+                if request.do_set:
+                    self.cache.invalidate(msg)
+                    if not self._start_set(msg, request.value, done, queued=request.queued, **request.kwargs):
+                        request.future.set_result(False)
+                elif not self.breaker.allow(msg):
+                    raise CircuitOpenError(f"{msg.name}: circuit open")
                 else:
-                    value = self._get_value(msg, **kwargs)
+                    self._start_query(msg, done, queued=request.queued, **request.kwargs)
             except Exception as e:
-                q.put(Exception(e))
-                raise e
-            else:
-                q.put(value)
-
+                request.future.set_exception(e)
+                logger.warn(f"handle request {msg.name}: {e!r}")
+
+        return handled
+
+    def _request_done(self, request: Request, tr: Transaction) -> None:
+        msg = tr.msg
+        if request.do_set:
+            answer = tr.answer
+            value = request.value
+            # INF is not acknowledged
+            ret = tr.cmd == Command.INF or (answer is not None and answer.cmd == Command.ACK)
+            if answer is None and tr.cmd != Command.INF:
+                logger.error(f"set_value: timeout: {msg.name}")
+            elif answer is not None and not ret:
+                logger.error(f"set_value: {msg.name}: {Command(answer.cmd).name}")
+                request.future.set_result(ret)
+                return
+        else:
             try:
-                for cb in self.callbacks:
-                    self._tpe.submit(cb, msg.name, value)
-            except Exception as e:
-                logger.warn("handle request: " + str(e))
-                logger.warn(traceback.format_exc())
+                value = ret = self._answer_value(tr)
+            except RequestError as e:
+                logger.error(f"get_value: {e}")
+                request.future.set_exception(e)
+                return
+            self.cache.update(msg, value)
+            self.scheduler.update(msg, value, tr.answered)
+        request.future.set_result(ret)
+
+        self.callbacks.publish(msg.name, value)
+
+    def _refresh(self) -> bool:
+        # One message at a time, so the requests are not blocked by a whole refresh round
+        if self.pending.full:
+            return False
 
+        start = time.monotonic()
+        msg = self.scheduler.pop_due(start)
+        if msg is None:
+            return False
+
+        # Just read
+        age = self.cache.age(msg)
+        if age is not None and age < self.COALESCE_TIME:
+            self.cache.coalesced += 1
+            self.scheduler.done(msg, start, start)
+            return False
+
+        if not self.breaker.allow(msg, start):
+            self.scheduler.done(msg, start, start)
+            self._postpone_open(msg)
+            return False
+
+        # Shared with the gets arriving while it is on the bus
+        request, new = self._shared_read(msg, Telegram.DEF_SRC, Priority.REFRESH)
+        if not new:
+            # About to be read by a request
+            self.scheduler.done(msg, start, start)
+            return False
+
+        request.future.set_running_or_notify_cancel()
+        try:
+            self._start_query(msg, partial(self._refresh_done, start, request))
+        except Exception as e:
+            logger.warn("refresh - get_value: " + str(e))
+            logger.warn(traceback.format_exc())
+            self.scheduler.done(msg, start, time.monotonic())
+            request.future.set_exception(e)
         return True
 
-    def _refresh(self) -> None:
-        requests = self._mon_requests
-
-        for msg, interval in requests.items():
-            if self._monitor_thread_event.is_set():
-                break
-            current_time = time.time()
-            next_refresh = self._mon_refresh.get(msg, 0)
-            if next_refresh is not None and current_time >= next_refresh:
-                self._mon_refresh[msg] = current_time + interval if interval is not None else None
-                try:
-                    val = self._get_value(msg)
-                except Exception as e:
-                    logger.warn("refresh - get_value: " + str(e))
-                    logger.warn(traceback.format_exc())
-                else:
-                    for cb in self.callbacks:
-                        self._tpe.submit(cb, msg.name, val)
+    def _refresh_done(self, start: float, request: Request, tr: Transaction) -> None:
+        msg = tr.msg
+        try:
+            val = self._answer_value(tr)
+        except RequestError as e:
+            logger.warn(f"refresh - get_value: {e}")
+            self.scheduler.done(msg, start, tr.answered)
+            self._postpone_open(msg)
+            request.future.set_exception(e)
+            return
+
+        self.cache.update(msg, val)
+        # The new interval applies to the next poll already
+        self.scheduler.update(msg, val, tr.answered)
+        self.scheduler.done(msg, start, tr.answered)
+        request.future.set_result(val)
+        self.callbacks.publish(msg.name, val)
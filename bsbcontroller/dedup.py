@@ -0,0 +1,53 @@
+from typing import Any
+
+from .telegram import Telegram
+
+
+class DuplicateFilter(object):
+    """ Suppression of repeated identical frames (e.g. INFs resent by thermostats)
+
+    A frame with the same bytes as one seen within the window of its message
+    (in seconds, default for all messages or set per name, 0 disables) is
+    a duplicate: it still updates the cache and the scheduler, but is only
+    counted instead of being passed on to the loggers and callbacks. A duplicate
+    is still passed on if heartbeat seconds passed since the last copy was.
+    """
+    def __init__(self, window: float = 0., heartbeat: float = 300.):
+        self.window = window
+        self.windows: dict[str, float] = {}
+        self.heartbeat = heartbeat
+
+        self.suppressed: dict[str, int] = {}
+        # Raw frame -> (last seen, last passed on)
+        self._seen: dict[bytes, tuple[float, float]] = {}
+
+    def window_for(self, name: str) -> float:
+        return self.windows.get(name, self.window)
+
+    def duplicate(self, telegram: Telegram, now: float) -> bool:
+        window = self.window_for(telegram.name)
+        if window <= 0:
+            return False
+
+        raw = telegram.to_raw()
+        seen = self._seen.get(raw)
+        if seen is not None and now - seen[0] <= window and now - seen[1] < self.heartbeat:
+            self._seen[raw] = (now, seen[1])
+            self.suppressed[telegram.name] = self.suppressed.get(telegram.name, 0) + 1
+            return True
+
+        if len(self._seen) > 1024:
+            self._prune(now)
+        self._seen[raw] = (now, now)
+        return False
+
+    def _prune(self, now: float) -> None:
+        # Changing values make new frames, forget the ones not seen for a while
+        limit = max([self.window, *self.windows.values()])
+        self._seen = {raw: seen for raw, seen in self._seen.items() if now - seen[0] <= limit}
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "suppressed": dict(self.suppressed),
+            "frames": len(self._seen),
+        }
@@ -0,0 +1,53 @@
+import dataclasses
+from typing import Any
+from dataclasses import dataclass
+from collections.abc import Iterable, Iterator
+
+from .telegram import Telegram, Message
+
+
+@dataclass(frozen=True)
+class Derivation:
+    """ Value of the target message taken from a field of a composite source message """
+    source: Message
+    field: str
+    target: Message
+
+
+class Derivations(object):
+    """ Rules deriving values of messages from broadcasts of composite telegrams
+
+    For example the boiler broadcasts status_hw (StatHW) with the outdoor temperature,
+    so outer_temp doesn't need to be polled:
+
+        derivations.add(messages_by_name["status_hw"], "outdoor_temp", messages_by_name["outer_temp"])
+    """
+    def __init__(self, rules: Iterable[Derivation] = ()):
+        self._by_source: dict[Message, list[Derivation]] = {}
+        for rule in rules:
+            self._add(rule)
+
+    def __len__(self) -> int:
+        return sum(len(rules) for rules in self._by_source.values())
+
+    def __iter__(self) -> Iterator[Derivation]:
+        return (rule for rules in self._by_source.values() for rule in rules)
+
+    def add(self, source: Message, field: str, target: Message) -> None:
+        if source.fields is None or not dataclasses.is_dataclass(source.fields) or field not in {f.name for f in dataclasses.fields(source.fields)}:
+            raise ValueError(f"Derivation: {source.name} has no field {field!r}")
+        self._add(Derivation(source, field, target))
+
+    def _add(self, rule: Derivation) -> None:
+        self._by_source.setdefault(rule.source, []).append(rule)
+
+    def derive(self, telegram: Telegram) -> list[tuple[Message, Any]]:
+        """ (target, value) pairs carried by the telegram """
+        rules = self._by_source.get(telegram.msg)
+        if not rules:
+            return []
+
+        value = telegram.value
+        if value is None:
+            return []
+        return [(rule.target, getattr(value, rule.field)) for rule in rules]
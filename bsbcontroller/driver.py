@@ -1,94 +1,248 @@
 import time
 import queue
+import threading
+import random
 import traceback
 import logging
 from typing import Optional
+from dataclasses import dataclass
 from serial import Serial, PARITY_ODD
 
-from .telegram import Telegram, CrcError
+from .telegram import Telegram
+from .telegram.crc import check_frame
 from .messages import messages_by_id
 
 
 logger = logging.getLogger("BSB")
 
 
+# Bytes on the wire are inverted by the adapter
+INVERT = bytes(range(255, -1, -1))
+
+
+class FrameParser(object):
+    """ Incremental parser of the received byte stream
+
+    Bytes are fed in chunks as they come from the serial port, complete frames
+    are found by SOF and length byte. Garbage and frames with bad CRC are skipped
+    one byte at a time, so the parser resyncs on the next SOF.
+    """
+    MIN_LEN = 11 # header (9B) + CRC (2B)
+    MAX_LEN = 64
+
+    def __init__(self) -> None:
+        self._buf = bytearray()
+
+    def feed(self, data: bytes) -> None:
+        self._buf += data.translate(INVERT)
+
+    def clear(self) -> None:
+        self._buf.clear()
+
+    def __len__(self) -> int:
+        return len(self._buf)
+
+    @property
+    def pending(self) -> bytes:
+        return bytes(self._buf)
+
+    @property
+    def missing(self) -> int:
+        """ Number of bytes needed to complete the frame at the start of the buffer """
+        buf = self._buf
+        if len(buf) < 4:
+            return 4 - len(buf)
+        return max(buf[3] - len(buf), 1)
+
+    def next_frame(self) -> Optional[bytes]:
+        buf = self._buf
+        pos = 0
+        try:
+            while True:
+                pos = buf.find(Telegram.SOF, pos)
+                if pos < 0:
+                    pos = len(buf)
+                    return None
+
+                if len(buf) - pos < 4:
+                    return None
+
+                length = buf[pos + 3]
+                if not self.MIN_LEN <= length <= self.MAX_LEN:
+                    pos += 1
+                    continue
+
+                if len(buf) - pos < length:
+                    return None
+
+                with memoryview(buf) as mv:
+                    raw = bytes(mv[pos:pos + length])
+
+                if not check_frame(raw):
+                    logger.warn(f"driver: Telegram CRC error: {list(raw)}")
+                    pos += 1
+                    continue
+
+                pos += length
+                return raw
+        finally:
+            del buf[:pos]
+
+
+@dataclass
+class TxPolicy:
+    retries: int = 10
+    # Silence required on the bus before transmitting (ten characters)
+    idle_gap: float = 10 * 11 / 4800
+    # Give up the attempt if the bus does not get idle in time
+    idle_timeout: float = 1.0
+    # Extra time for the echo after the frame has been transmitted
+    echo_margin: float = 0.05
+    # Randomised exponential backoff after a collision
+    backoff_base: float = 0.1
+    backoff_max: float = 1.6
+    # Give up the telegram when the attempts took this long (s), whatever retries is
+    deadline: float = 8.0
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+@dataclass
+class TxAttempt:
+    idle_wait: float
+    transmit: float
+    idle: bool
+    echoed: bool
+    backoff: float = 0.
+
+    def __str__(self) -> str:
+        return f"idle: {self.idle_wait * 1000:.0f}ms{'' if self.idle else ' (busy)'}, tx: {self.transmit * 1000:.0f}ms{'' if self.echoed else ' (no echo)'}, backoff: {self.backoff * 1000:.0f}ms"
+
+
 class BsbDriver(object):
     BAUD = 4800
     BYTE_TIME = 1 / (BAUD / 11.0)
 
-    def __init__(self, port: str):
+    def __init__(self, port: str, tx_policy: Optional[TxPolicy] = None):
         # Timeout if nothing received for ten characters (11 for start+8b+parity+stop bits)
         TIMEOUT = 1. / (self.BAUD / 11) * 10
 
-        self._buffer: list[int] = []
+        self._parser = FrameParser()
         self._ooo_queue: queue.Queue[Telegram] = queue.Queue()
+        self._last_rx = 0.
+
+        self.tx_policy = tx_policy if tx_policy is not None else TxPolicy()
+        # Timing of each transmit attempt of the last sent telegram
+        self.last_tx: list[TxAttempt] = []
 
         self._serial = Serial(port, self.BAUD, timeout=TIMEOUT, parity=PARITY_ODD)
 
-    def receive_telegram(self, wait: bool = True) -> Optional[Telegram]:
+    def receive_telegram(self, wait: bool = True, deadline: Optional[float] = None, wake: Optional[threading.Event] = None) -> Optional[Telegram]:
+        """ Next frame received; with a deadline waits for one until then, or until wake is set """
         if not self._ooo_queue.empty():
             return self._ooo_queue.get_nowait()
 
-        return self._receive_telegram(wait)
+        return self._receive_telegram(wait, deadline, wake)
 
-    def _receive_telegram(self, wait: bool = True) -> Optional[Telegram]:
+    def _receive_telegram(self, wait: bool = True, deadline: Optional[float] = None, wake: Optional[threading.Event] = None) -> Optional[Telegram]:
         TIMEOUT = 20
 
         timeout = TIMEOUT
-        buf = self._buffer
-        while timeout > 0 and (self._serial.in_waiting > 0 or (wait and buf)):
-            data = self._serial.read(1)
-            if not data:
-                timeout -= 1
-                continue
-
-            # Reset timeout
-            timeout = TIMEOUT
-            byte = data[0] ^ 0xff
-
-            # Wait for SOF
-            if not buf and byte != Telegram.SOF:
-                continue
-
-            buf.append(byte)
-            length = buf[3] if len(buf) > 3 else -1
-            if len(buf) == length:
+        parser = self._parser
+        while True:
+            raw = parser.next_frame()
+            if raw is not None:
                 try:
-                    telegram = Telegram.from_raw(bytes(buf), messages_by_id)
-                    buf.clear()
-                except CrcError:
-                    logger.warn(f"driver: Telegram CRC error: {buf}")
-                    buf.clear()
+                    return Telegram.from_raw(raw, messages_by_id)
                 except Exception as e:
-                    logger.error(f"driver: Telegram error: {e}: {buf}")
+                    logger.error(f"driver: Telegram error: {e}: {list(raw)}")
                     logger.error(traceback.format_exc())
-                    buf.clear()
-                else:
-                    return telegram
+                    continue
 
-        if timeout == 0:
-            logger.warn(f"driver: Timeout {buf}")
-            buf.clear()
-        return None
+            if timeout <= 0:
+                break
 
-    def send_telegram(self, telegram: Telegram, retries: int = 10) -> bool:
-        msg = bytes([x ^ 0xff for x in telegram.to_raw()])
+            waiting = self._serial.in_waiting
+            if not waiting and not (wait and len(parser)):
+                # Checked between the reads, each one blocks for ten characters at most
+                if deadline is None or time.monotonic() >= deadline or (wake is not None and wake.is_set()):
+                    return None
 
-        while retries:
-            self._serial.write(msg)
-            time.sleep(self.BYTE_TIME * len(msg) * 2)
-            retries -= 1
+            # Read everything available at once, or block for the rest of the current frame
+            data = self._serial.read(max(waiting, parser.missing))
+            if not data:
+                if len(parser):
+                    timeout -= 1
+                continue
 
-            recv: Optional[Telegram] = telegram
-            while recv:
-                recv = self._receive_telegram(True)
-                if recv:
-                    if telegram.to_raw() == recv.to_raw():
-                        return True
-                    else:
-                        self._ooo_queue.put_nowait(recv)
+            # Reset timeout
+            timeout = TIMEOUT
+            self._last_rx = time.monotonic()
+            parser.feed(data)
 
-            time.sleep(1.567)
-            logger.warn(f"driver: sent telegram not received back, resending: {telegram}")
+        logger.warn(f"driver: Timeout {list(parser.pending)}")
+        parser.clear()
+        return None
 
+    def _wait_idle(self, deadline: float) -> bool:
+        gap = self.tx_policy.idle_gap
+        while True:
+            # Keep the frames received meanwhile for the upper layer
+            while (recv := self._receive_telegram(False)) is not None:
+                self._ooo_queue.put_nowait(recv)
+
+            now = time.monotonic()
+            quiet = now - self._last_rx
+            if not len(self._parser) and not self._serial.in_waiting and quiet >= gap:
+                return True
+            if now >= deadline:
+                return False
+            time.sleep(max(0., min(gap - quiet, deadline - now)) or self.BYTE_TIME)
+
+    def _wait_echo(self, raw: bytes, deadline: float) -> bool:
+        while True:
+            recv = self._receive_telegram(True, deadline)
+            if recv is None:
+                return False
+            if recv.to_raw() == raw:
+                return True
+            self._ooo_queue.put_nowait(recv)
+
+    def send_telegram(self, telegram: Telegram, retries: Optional[int] = None) -> bool:
+        policy = self.tx_policy
+        raw = telegram.to_raw()
+        msg = raw.translate(INVERT)
+        frame_time = self.BYTE_TIME * len(msg)
+
+        attempts: list[TxAttempt] = []
+        self.last_tx = attempts
+
+        retries = policy.retries if retries is None else retries
+        end = time.monotonic() + policy.deadline
+        for attempt in range(retries):
+            start = time.monotonic()
+            idle = self._wait_idle(min(start + policy.idle_timeout, end))
+            sent = time.monotonic()
+            echoed = False
+            if idle:
+                self._serial.write(msg)
+                echoed = self._wait_echo(raw, sent + frame_time * 2 + policy.echo_margin)
+
+            tx = TxAttempt(sent - start, time.monotonic() - sent, idle, echoed)
+            attempts.append(tx)
+            if echoed:
+                return True
+
+            reason = "sent telegram not received back" if idle else "bus busy"
+            left = end - time.monotonic()
+            if attempt + 1 >= retries or left <= 0:
+                logger.warn(f"driver: {reason}: {telegram} ({tx})")
+                break
+
+            tx.backoff = min(policy.backoff(attempt), left)
+            logger.warn(f"driver: {reason}, resending: {telegram} ({tx})")
+            time.sleep(tx.backoff)
+
+        logger.warn(f"driver: giving up after {len(attempts)} attempts: {telegram}")
         return False
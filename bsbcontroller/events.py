@@ -0,0 +1,202 @@
+import enum
+import logging
+import threading
+import traceback
+from typing import Any, Optional
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+
+
+logger = logging.getLogger("BSB")
+
+
+class DropPolicy(enum.Enum):
+    # Discard the oldest event when the queue is full
+    DROP_OLDEST = "drop_oldest"
+    # Keep only the latest event per key, discard the oldest key when full
+    COALESCE = "coalesce"
+    # Make the publisher wait for space in the queue
+    BLOCK = "block"
+
+
+class Subscriber(object):
+    """ Own bounded queue and worker thread of one event handler
+
+    The handler is called with the arguments of each event or, with batch > 1,
+    with a list of up to batch argument tuples of the events queued meanwhile.
+    """
+    def __init__(self, handler: Callable[..., None], maxsize: int = 1000, policy: DropPolicy = DropPolicy.DROP_OLDEST, key: Optional[Callable[..., Hashable]] = None, batch: int = 1):
+        if policy == DropPolicy.COALESCE and key is None:
+            raise ValueError("Subscriber: coalesce policy needs a key")
+
+        self.handler = handler
+        self.name = getattr(handler, "__qualname__", repr(handler))
+        self.maxsize = maxsize
+        self.policy = policy
+        self.key = key
+        self.batch = batch
+
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_lag = 0
+
+        # Events by an unique key (a sequence number if not coalesced), in order of arrival
+        self._queue: OrderedDict[Hashable, tuple[Any, ...]] = OrderedDict()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=f"event: {self.name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def lag(self) -> int:
+        return len(self._queue)
+
+    def put(self, args: tuple[Any, ...]) -> None:
+        with self._cond:
+            queue = self._queue
+            if self.key is not None and self.policy == DropPolicy.COALESCE:
+                key = self.key(*args)
+                if key in queue:
+                    queue[key] = args
+                    self.coalesced += 1
+                    return
+            else:
+                key = self._seq
+                self._seq += 1
+
+            if self._stopped:
+                return
+            if len(queue) >= self.maxsize:
+                if self.policy == DropPolicy.BLOCK:
+                    while len(queue) >= self.maxsize and not self._stopped:
+                        self._cond.wait()
+                else:
+                    queue.popitem(last=False)
+                    self.dropped += 1
+
+            queue[key] = args
+            self.max_lag = max(self.max_lag, len(queue))
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "policy": self.policy.value,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+        }
+
+    def _take(self) -> Optional[list[tuple[Any, ...]]]:
+        with self._cond:
+            while not self._queue and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return None
+
+            events = [self._queue.popitem(last=False)[1] for _ in range(min(self.batch, len(self._queue)))]
+            # Wake up a blocked publisher
+            self._cond.notify_all()
+            return events
+
+    def _run(self) -> None:
+        while (events := self._take()) is not None:
+            try:
+                if self.batch > 1:
+                    self.handler(events)
+                else:
+                    self.handler(*events[0])
+            except Exception as e:
+                logger.warn(f"event handler {self.name}: {e}")
+                logger.warn(traceback.format_exc())
+            self.delivered += len(events)
+
+
+class EventBus(list[Callable[..., None]]):
+    """ List of event handlers, each one gets the published events through its own Subscriber
+
+    Handlers appended to the list get the default options, subscribe() sets them per handler.
+    """
+    def __init__(self, maxsize: int = 1000) -> None:
+        super().__init__()
+        self.maxsize = maxsize
+        self._subscribers: dict[Callable[..., None], Subscriber] = {}
+        # Called by the publisher itself
+        self._inline: set[Callable[..., None]] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, handler: Callable[..., None], policy: DropPolicy = DropPolicy.DROP_OLDEST, key: Optional[Callable[..., Hashable]] = None, batch: int = 1, maxsize: Optional[int] = None) -> Subscriber:
+        subscriber = Subscriber(handler, self.maxsize if maxsize is None else maxsize, policy, key, batch)
+        with self._lock:
+            old = self._subscribers.pop(handler, None)
+            if old is not None:
+                old.stop()
+            self._subscribers[handler] = subscriber
+        if handler not in self:
+            self.append(handler)
+        return subscriber
+
+    def subscribe_inline(self, handler: Callable[..., None]) -> None:
+        """ The handler is called in the publishing thread (the monitor's), it must only hand the event over, e.g. to a Subscriber """
+        with self._lock:
+            old = self._subscribers.pop(handler, None)
+            if old is not None:
+                old.stop()
+            self._inline.add(handler)
+        if handler not in self:
+            self.append(handler)
+
+    def publish(self, *args: Any) -> None:
+        with self._lock:
+            subscribers = self._subscribers
+            current = []
+            inline = []
+            for handler in list(self):
+                if handler in self._inline:
+                    inline.append(handler)
+                    continue
+                subscriber = subscribers.get(handler)
+                if subscriber is None:
+                    subscriber = subscribers[handler] = Subscriber(handler, self.maxsize)
+                current.append(subscriber)
+
+            # Removed from the list
+            if len(subscribers) > len(current):
+                for handler in [h for h in subscribers if h not in self]:
+                    subscribers.pop(handler).stop()
+            if len(self._inline) > len(inline):
+                self._inline.intersection_update(inline)
+
+        # Not under the lock, a blocking subscriber can make it wait
+        for subscriber in current:
+            subscriber.put(args)
+        for handler in inline:
+            try:
+                handler(*args)
+            except Exception as e:
+                logger.warn(f"event handler {getattr(handler, '__qualname__', repr(handler))}: {e}")
+                logger.warn(traceback.format_exc())
+
+    def stop(self) -> None:
+        with self._lock:
+            for subscriber in self._subscribers.values():
+                subscriber.stop()
+            self._subscribers.clear()
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        stats: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for s in self._subscribers.values():
+                name = s.name
+                if name in stats:
+                    name = f"{name}#{sum(k.split('#')[0] == s.name for k in stats)}"
+                stats[name] = s.stats()
+        return stats
@@ -9,7 +9,8 @@ import threading
 import json
 
 from .. import Bsb
-from ..telegram import Telegram, Command
+from ..telegram import Telegram, TelegramRecord, Command
+from ..telegram.codecs import decode_cache
 from ..messages import messages_by_id
 
 
@@ -46,9 +47,23 @@ class HttpLogHandler(MyBaseHTTPRequestHandler):
         qset = query.get("set")
         qval = query.get("val")
         if qget is not None:
-            val = bsb.get_value(qget[0])
+            qage = query.get("max_age")
+            val = bsb.get_value(qget[0], max_age=float(qage[0]) if qage else None)
             self.wfile.write(json.dumps(val, indent=4).encode('utf8'))
             return
+        elif query.get("stats") is not None:
+            stats = {
+                "cache": bsb.cache.stats(),
+                "decode_cache": decode_cache.stats(),
+                "dedup": bsb.dedup.stats(),
+                "callbacks": bsb.callbacks.stats(),
+                "loggers": bsb.loggers.stats(),
+            }
+            self.wfile.write(json.dumps(stats, indent=4).encode('utf8'))
+            return
+        elif query.get("circuits") is not None:
+            self.wfile.write(json.dumps(bsb.breaker.stats(), indent=4).encode('utf8'))
+            return
         elif qset is not None and qval is not None:
             try:
                 val = json.loads(qval[0])
@@ -99,7 +114,7 @@ class TelegramLogger:
 
         filename = "/srv/hac/telegram_log.json"
 
-        self.logs: dict[str, list[Telegram]] = {k: [] for k in filters.keys()}
+        self.logs: dict[str, list[TelegramRecord]] = {k: [] for k in filters.keys()}
         self.filters = filters
 
         if False:
@@ -126,10 +141,13 @@ class TelegramLogger:
         self._append_log(t)
 
     def _append_log(self, t: Telegram) -> None:
+        record = None
         for k, (fn, max_cnt) in self.filters.items():
             log = self.logs[k]
             if fn(t):
-                log.append(t)
+                if record is None:
+                    record = TelegramRecord.from_telegram(t)
+                log.append(record)
                 if len(log) > max_cnt:
                     log.pop(0)
 
@@ -1,5 +1,6 @@
 from .telegram import Flag, Message as M
 from .telegram import fields as f
+from .catalog import Catalog
 
 
 FB = Flag.FB
@@ -123,6 +124,7 @@ messages = [
     M(0x053d3043, FB, f.Int16,      "gas_quality"),
 ]
 
-messages_by_name = {msg.name: msg for msg in messages}
-#messages_by_id = {msg.param & 0xffff: msg for msg in messages}
-messages_by_id = {msg.param: msg for msg in messages}
+# Built-in definitions, more can be loaded with catalog.load_file()
+catalog = Catalog(messages)
+messages_by_name = catalog.by_name
+messages_by_id = catalog.by_id
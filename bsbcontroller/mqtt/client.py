@@ -1,13 +1,17 @@
 import time
 import threading
 import json
-from typing import Callable, Any
+import concurrent.futures
+from functools import partial
+from typing import Callable, Any, Optional
 
 import paho.mqtt.client as mqtt_client
 
-from .. import Bsb
+from .. import Bsb, Priority
+from ..events import DropPolicy, Subscriber
 from ..telegram import Telegram, Command
 from .templates import Template
+from .publisher import Publisher
 from . import messages
 
 
@@ -28,12 +32,25 @@ class MqttBsbClient(threading.Thread):
         self._bsb = bsb
 
         self._values: dict[str, Any] = {}
+        # Queue of the value updates to publish, set when connected
+        self._value_events: Optional[Subscriber] = None
+        # Called from the callback and logger workers
+        self._values_lock = threading.Lock()
         self._prefix = "home/boiler"
         self._enabled_topics: list[str] = []
 
         self._config = config
+        publish = self._config.get("publish", {})
+        # State updates, latest value wins
+        self._publisher = Publisher(client, publish.get("interval", 0.1), publish.get("batch", 20))
+        self.qos: dict[str, int] = self._config.get("qos", {})
         self.translations = self._config.get("rename", {})
         self.enabled_requests = self._config.get("allow_set", [])
+        # Topic -> message name of the items which can be set
+        self._set_topics = {f"{self._prefix}/{self.translations.get(name, name)}/set": name for name in self.enabled_requests}
+        # Items being set: the next (value, accepted time) to write when the running write finishes
+        self._sets: dict[str, Optional[tuple[Any, float]]] = {}
+        self._sets_lock = threading.Lock()
 
     def start(self) -> None:
         while True:
@@ -48,58 +65,118 @@ class MqttBsbClient(threading.Thread):
                 break
 
         self._client.loop_start()
+        self._publisher.start()
 
     def stop(self) -> None:
+        self._publisher.stop()
         self._client.loop_stop()
         self._client.disconnect()
 
     def _on_connect(self, client: mqtt_client.Client, userdata: Any, flags: dict[str, Any], rc: Any) -> None:
-        self._client.subscribe("#")
+        if self._set_topics:
+            self._client.subscribe([(topic, 0) for topic in self._set_topics])
 
-        self._bsb.callbacks.append(self._bsb_callback)
-        self._bsb.loggers.append(self._bsb_log)
+        # Only the latest value of each item is worth publishing
+        self._value_events = self._bsb.callbacks.subscribe(self._bsb_callback, DropPolicy.COALESCE, key=lambda request, value: request)
+        # Values seen on the bus join the same queue in bus order, a worker of their own could overtake it
+        self._bsb.loggers.subscribe_inline(self._bsb_log)
 
         self.setup_mqtt_ha_discovery()
+        # Initial values come through the callbacks, don't block the network loop
         for name in self.items.keys():
-            self._bsb.get_value(name)
+            self._bsb.get_value_async(name, priority=Priority.REFRESH)
 
     def _on_message(self, client: mqtt_client.Client, userdata: Any, msg: mqtt_client.MQTTMessage) -> None:
-        topic = msg.topic
-
-        if topic.startswith(f"{self._prefix}/") and topic.endswith("/set"):
-            request = topic.removeprefix(f"{self._prefix}/").removesuffix("/set")
-            request = self.translations.get(request, request)
-
-            if request in self.enabled_requests:
-                val = msg.payload.decode()
-                try:
-                    val = json.loads(val)
-                except Exception:
-                    pass
-
-                self._bsb.set_value(request, val)
+        request = self._set_topics.get(msg.topic)
+        if request is None:
+            return
+
+        val = msg.payload.decode()
+        try:
+            val = json.loads(val)
+        except Exception:
+            pass
+
+        self._set(request, val)
+
+    def _set(self, request: str, value: Any) -> None:
+        # Runs in the network loop, must not wait for the bus
+        accepted = time.monotonic()
+        self._publish_result(request, "accepted", value)
+        with self._sets_lock:
+            running = request in self._sets
+            if running:
+                # Dragged slider: only the latest value is written after the running write
+                superseded = self._sets[request]
+                self._sets[request] = (value, accepted)
+            else:
+                self._sets[request] = None
+
+        if not running:
+            self._start_set(request, value, accepted)
+        elif superseded is not None:
+            self._publish_result(request, "superseded", superseded[0], time.monotonic() - superseded[1])
+
+    def _start_set(self, request: str, value: Any, accepted: float) -> None:
+        try:
+            future = self._bsb.set_value_async(request, value)
+        except Exception as e:
+            # Not queued, no callback will start the next write
+            self._publish_result(request, "failed", value, time.monotonic() - accepted, str(e) or type(e).__name__)
+            self._next_set(request)
+            return
+        future.add_done_callback(partial(self._set_done, request, value, accepted))
+
+    def _set_done(self, request: str, value: Any, accepted: float, future: concurrent.futures.Future[Any]) -> None:
+        error = None
+        try:
+            confirmed = bool(future.result())
+        except Exception as e:
+            confirmed = False
+            error = str(e) or type(e).__name__
+        self._publish_result(request, "confirmed" if confirmed else "failed", value, time.monotonic() - accepted, error)
+        self._next_set(request)
+
+    def _next_set(self, request: str) -> None:
+        """ The write of the item ended, start the one of the latest value set meanwhile """
+        with self._sets_lock:
+            following = self._sets.pop(request, None)
+            if following is not None:
+                self._sets[request] = None
+        if following is not None:
+            self._start_set(request, *following)
+
+    def _publish_result(self, request: str, status: str, value: Any, latency: Optional[float] = None, error: Optional[str] = None) -> None:
+        name = self.translations.get(request, request)
+        payload: dict[str, Any] = {"status": status, "value": value}
+        if latency is not None:
+            payload["latency"] = round(latency, 3)
+        if error is not None:
+            payload["error"] = error
+        self._client.publish(f"{self._prefix}/{name}/result", json.dumps(payload, default=str))
 
     def _bsb_callback(self, request: str, value: Any) -> None:
         if request in self._enabled_topics:
-            added = False
-            if request not in self._values:
-                self._values[request] = None
-                added = True
-
             if request in self.corrections:
                 value = self.corrections[request](value)
 
-            if value != self._values[request] or added:
+            with self._values_lock:
+                if request in self._values and value == self._values[request]:
+                    return
                 self._values[request] = value
 
-                name = self.translations.get(request, request)
-                self._client.publish(f"{self._prefix}/{name}/state", value, retain=True)
+            name = self.translations.get(request, request)
+            self._publisher.publish(f"{self._prefix}/{name}/state", value, qos=self.qos.get(request, 0), retain=True)
 
     def _bsb_log(self, telegram: Telegram) -> None:
+        # Called in the monitor thread
+        events = self._value_events
+        if events is None:
+            return
         if telegram.cmd in [Command.INF]:
-            self._bsb_callback(telegram.name, telegram.value)
+            events.put((telegram.name, telegram.value))
         elif telegram.cmd == Command.ANS and telegram.dst != Telegram.DEF_SRC:
-            self._bsb_callback(telegram.name, telegram.value)
+            events.put((telegram.name, telegram.value))
 
     def _publish_config(self, request: str, template: Template) -> None:
         component = template.component
@@ -0,0 +1,59 @@
+import threading
+from typing import Any
+from collections import OrderedDict
+
+import paho.mqtt.client as mqtt_client
+
+
+class Publisher(threading.Thread):
+    """ Outgoing MQTT messages with a single slot per topic
+
+    Only the latest payload of a topic waits to be sent, an older one is
+    replaced and keeps its place in the queue. Every interval seconds at most
+    batch messages are handed to the client, so the traffic stays bounded
+    however bursty the bus is.
+    """
+    def __init__(self, client: mqtt_client.Client, interval: float = 0.1, batch: int = 20):
+        threading.Thread.__init__(self, name="mqtt publisher", daemon=True)
+
+        self.interval = interval
+        self.batch = batch
+
+        self.published = 0
+        self.replaced = 0
+
+        self._client = client
+        self._slots: OrderedDict[str, tuple[Any, int, bool]] = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+
+    def publish(self, topic: str, payload: Any, qos: int = 0, retain: bool = False) -> None:
+        with self._cond:
+            if topic in self._slots:
+                self.replaced += 1
+            self._slots[topic] = (payload, qos, retain)
+            self._cond.notify()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._cond:
+            self._cond.notify()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "published": self.published,
+            "replaced": self.replaced,
+            "waiting": len(self._slots),
+        }
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            with self._cond:
+                while not self._slots and not self._stopped.is_set():
+                    self._cond.wait()
+                batch = [self._slots.popitem(last=False) for _ in range(min(self.batch, len(self._slots)))]
+
+            for topic, (payload, qos, retain) in batch:
+                self._client.publish(topic, payload, qos=qos, retain=retain)
+            self.published += len(batch)
+            self._stopped.wait(self.interval)
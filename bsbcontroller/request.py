@@ -0,0 +1,95 @@
+import enum
+import time
+import heapq
+import itertools
+import threading
+import concurrent.futures
+from typing import Any, Optional
+from dataclasses import dataclass, field
+
+from .telegram import Message
+
+
+class RequestError(Exception):
+    pass
+
+
+class SendError(RequestError):
+    """ The telegram could not be transmitted (bus busy or no echo) """
+
+
+class NoAnswerError(RequestError, TimeoutError):
+    """ No answer to the telegram in time """
+
+
+class RejectedError(RequestError):
+    """ Answered by NAK or ERR, usually an unsupported parameter """
+
+
+class Priority(enum.IntEnum):
+    SET = 0
+    GET = 1
+    REFRESH = 2
+
+
+@dataclass(eq=False)
+class Request:
+    msg: Message
+    value: Any
+    do_set: bool
+    kwargs: dict[str, Any]
+    priority: Priority
+    timeout: Optional[float] = None
+    queued: float = field(default_factory=time.monotonic)
+    future: concurrent.futures.Future[Any] = field(default_factory=concurrent.futures.Future)
+
+    @property
+    def expired(self) -> bool:
+        return self.timeout is not None and time.monotonic() > self.queued + self.timeout
+
+
+class RequestQueue(object):
+    """ Thread-safe queue of bus requests, by priority and FIFO within a priority """
+    def __init__(self) -> None:
+        self._heap: list[tuple[int, int, Request]] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        # Set while requests are queued, wakes up the idle monitor
+        self.ready = threading.Event()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def put(self, request: Request) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (request.priority, next(self._seq), request))
+            self.ready.set()
+
+    def promote(self, request: Request, priority: Priority) -> None:
+        """ Raise the priority of a queued request, it keeps its place among the requests of that priority """
+        with self._lock:
+            if priority >= request.priority:
+                return
+            request.priority = priority
+            heap = self._heap
+            for i, (_, seq, queued) in enumerate(heap):
+                if queued is request:
+                    heap[i] = (priority, seq, request)
+                    heapq.heapify(heap)
+                    break
+
+    def get(self) -> Optional[Request]:
+        """ Next request to run, the cancelled and timed out ones are dropped """
+        while True:
+            with self._lock:
+                if not self._heap:
+                    self.ready.clear()
+                    return None
+                request = heapq.heappop(self._heap)[2]
+
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            if request.expired:
+                request.future.set_exception(TimeoutError(f"{request.msg.name}: request timed out in queue"))
+                continue
+            return request
@@ -0,0 +1,189 @@
+import heapq
+import random
+import itertools
+from typing import Any, Optional
+from collections import deque
+from dataclasses import dataclass
+
+from .telegram import Message
+
+
+@dataclass
+class AdaptiveInterval:
+    """ Poll interval following the rate of change of the value
+
+    The interval is halved when the value changed by threshold or more since
+    the previous reading and doubled when it did not, within min/max. While the
+    trigger message has one of the active values, the min. interval is used.
+    """
+    min_interval: float
+    max_interval: float
+    threshold: float = 0.
+    trigger: Optional[Message] = None
+    active: tuple[Any, ...] = ()
+
+    def changed(self, old: Any, new: Any) -> bool:
+        if isinstance(old, (int, float)) and isinstance(new, (int, float)) and not isinstance(new, bool):
+            delta = abs(new - old)
+            return delta > 0 and delta >= self.threshold
+        return bool(old != new)
+
+
+class RefreshScheduler(object):
+    """ Next-due priority queue of the monitored messages
+
+    Intervals get a random jitter, so messages with the same interval drift apart
+    instead of coming due in one burst. Polling is limited to a share of bus time
+    (max_duty) measured over a sliding window. Messages with an AdaptiveInterval
+    are polled more often while their value changes.
+    """
+    def __init__(self, max_duty: float = 0.5, jitter: float = 0.1, window: float = 60.):
+        self.max_duty = max_duty
+        self.jitter = jitter
+        self.window = window
+
+        self._intervals: dict[Message, Optional[float]] = {}
+        self._adaptive: dict[Message, AdaptiveInterval] = {}
+        self._last: dict[Message, Any] = {}
+        # Adaptive messages by their trigger message, and the ones triggered now
+        self._triggered: dict[Message, list[Message]] = {}
+        self._active: set[Message] = set()
+        self._due: dict[Message, float] = {}
+        self._heap: list[tuple[float, int, Message]] = []
+        self._seq = itertools.count()
+        # (end, duration) of the polls within the window
+        self._busy: deque[tuple[float, float]] = deque()
+        self._busy_time = 0.
+
+    def __contains__(self, msg: object) -> bool:
+        return msg in self._intervals
+
+    def set_monitored(self, monitor: dict[Message, int | AdaptiveInterval | None], now: float) -> None:
+        self._intervals = {}
+        self._adaptive = {}
+        self._last.clear()
+        self._triggered.clear()
+        self._active.clear()
+        for msg, interval in monitor.items():
+            if isinstance(interval, AdaptiveInterval):
+                self._adaptive[msg] = interval
+                self._intervals[msg] = interval.min_interval
+                if interval.trigger is not None:
+                    self._triggered.setdefault(interval.trigger, []).append(msg)
+            else:
+                self._intervals[msg] = interval
+
+        self._due.clear()
+        self._heap.clear()
+        # Everything is due at start, the duty budget spreads the first round
+        for msg in self._intervals:
+            self._schedule(msg, now)
+
+    def interval(self, msg: Message) -> Optional[float]:
+        if msg in self._active:
+            return self._adaptive[msg].min_interval
+        return self._intervals.get(msg)
+
+    def update(self, msg: Message, value: Any, now: float) -> None:
+        """ A new value of the message was read or seen, adapt the intervals """
+        adaptive = self._adaptive.get(msg)
+        if adaptive is not None:
+            interval = self._intervals[msg] or adaptive.min_interval
+            if msg in self._last:
+                if adaptive.changed(self._last[msg], value):
+                    interval = max(adaptive.min_interval, interval / 2)
+                else:
+                    interval = min(adaptive.max_interval, interval * 2)
+            self._intervals[msg] = interval
+            self._last[msg] = value
+
+        for dep in self._triggered.get(msg, ()):
+            if value not in self._adaptive[dep].active:
+                self._active.discard(dep)
+                continue
+
+            self._active.add(dep)
+            # Don't wait for the slow poll to come due
+            due = now + self._adaptive[dep].min_interval
+            current = self._due.get(dep)
+            if current is not None and due < current:
+                self._schedule(dep, due)
+
+    def _schedule(self, msg: Message, due: float) -> None:
+        self._due[msg] = due
+        heapq.heappush(self._heap, (due, next(self._seq), msg))
+
+    def _peek(self) -> Optional[tuple[float, Message]]:
+        heap = self._heap
+        while heap:
+            due, _, msg = heap[0]
+            # Skip the entries superseded by a reschedule
+            if self._due.get(msg) == due:
+                return due, msg
+            heapq.heappop(heap)
+        return None
+
+    def next_due(self, now: float) -> Optional[float]:
+        """ Time the next poll can start, later than its due time if the duty budget is used up """
+        item = self._peek()
+        if item is None:
+            return None
+
+        due = item[0]
+        if self._busy and self.duty(now) >= self.max_duty:
+            # The oldest poll leaves the window
+            due = max(due, self._busy[0][0] + self.window)
+        return due
+
+    def duty(self, now: float) -> float:
+        busy = self._busy
+        while busy and busy[0][0] < now - self.window:
+            self._busy_time -= busy.popleft()[1]
+        return self._busy_time / self.window
+
+    def pop_due(self, now: float) -> Optional[Message]:
+        item = self._peek()
+        if item is None or item[0] > now or self.duty(now) >= self.max_duty:
+            return None
+
+        heapq.heappop(self._heap)
+        msg = item[1]
+        del self._due[msg]
+        return msg
+
+    def done(self, msg: Message, start: float, end: float) -> None:
+        # Pipelined polls overlap, count the overlapping time once
+        begin = min(end, max(start, self._busy[-1][0])) if self._busy else start
+        self._busy.append((end, end - begin))
+        self._busy_time += end - begin
+
+        interval = self.interval(msg)
+        if interval is not None:
+            due = start + interval * (1 + random.uniform(-self.jitter, self.jitter))
+            # Keep an earlier poll requested meanwhile (poll_at)
+            current = self._due.get(msg)
+            if current is None or due < current:
+                self._schedule(msg, due)
+
+    def observed(self, msg: Message, now: float) -> bool:
+        """ A value of the message was seen on the bus, push its next poll a full interval out """
+        interval = self.interval(msg)
+        if interval is None:
+            return False
+        return self.postpone(msg, now + interval)
+
+    def poll_at(self, msg: Message, due: float) -> bool:
+        """ An extra poll of the message (monitored or not) at due, unless one is due earlier """
+        current = self._due.get(msg)
+        if current is not None and current <= due:
+            return False
+        self._schedule(msg, due)
+        return True
+
+    def postpone(self, msg: Message, due: float) -> bool:
+        """ Move the next poll of the message to due, if it is later than the current one """
+        current = self._due.get(msg)
+        if current is None or due <= current:
+            return False
+        self._schedule(msg, due)
+        return True
@@ -3,12 +3,14 @@ import time
 import datetime
 import logging
 
-from functools import partial
 from typing import Any
 
 from . import Bsb
 
 from .telegram import Telegram, Command, Message
+from .messages import messages_by_name
+from .scheduler import AdaptiveInterval
+from .driver import TxPolicy
 
 from .http.logger import ThreadHttpLogServer, MyLogger
 from .mqtt import MqttBsbClient
@@ -30,6 +32,13 @@ corrections = {
     "burner_modulation_pct": corr_none2zero,
 }
 
+# Used without a react section in the config: a HC status broadcast means
+# the program can have changed the requested temperature
+default_reactions = {
+    "hc1_status": {"room1_temp_req": 2},
+    "hc2_status": {"room2_temp_req": 2},
+}
+
 
 def bsb_onetime_init(bsb: Bsb) -> None:
     bsb.set_value("datetime", datetime.datetime.now())
@@ -63,36 +72,44 @@ def bsb_onetime_init(bsb: Bsb) -> None:
 
 
 class MyBsbHandler():
-    react = {
-        "hc1_status": "room1_temp_req",
-        "hc2_status": "room2_temp_req",
-    }
     ignored = [
         Command.QUR,
     ]
 
-    def __init__(self, bsb: Bsb) -> None:
-        def sag(bsb: Bsb, req: str) -> None: # sleep and get
-            time.sleep(2)
-            bsb.get_value(req)
-
-        self._bsb = bsb
-        self._react = {k: partial(sag, bsb, v) for k, v in self.react.items()}
-
     def bsb_log_handler(self, telegram: Telegram) -> None:
         if telegram.cmd not in self.ignored:
-            logger.info(str(telegram))
-
-        if telegram.name in self._react:
-            # The program can have changed the requested temperature
-            self._react[telegram.name]()
-
-
-def run(config: Any, monitored_msgs: dict[Message, int | None]) -> None:
-    bsb = Bsb(config.get("bsbport"))
+            logger.info("%s", telegram)
+
+
+def run(config: Any, monitored_msgs: dict[Message, int | AdaptiveInterval | None]) -> None:
+    bus = config.get("bus", {})
+    bsb = Bsb(config.get("bsbport"), TxPolicy(**bus.get("tx", {})))
+    bsb.pending.window = bus.get("window", bsb.pending.window)
+    bsb.pending.timeout = bus.get("answer_timeout", bsb.pending.timeout)
+    breaker = config.get("breaker", {})
+    bsb.breaker.threshold = breaker.get("threshold", bsb.breaker.threshold)
+    bsb.breaker.backoff = breaker.get("backoff", bsb.breaker.backoff)
+    bsb.breaker.backoff_max = breaker.get("backoff_max", bsb.breaker.backoff_max)
+    for target, source in config.get("derive", {}).items():
+        name, field = source.split(".", 1)
+        bsb.derivations.add(messages_by_name[name], field, messages_by_name[target])
+    for trigger, targets in config.get("react", default_reactions).items():
+        for target, delay in targets.items():
+            bsb.add_reaction(trigger, target, delay)
+    dedup = config.get("dedup", {})
+    bsb.dedup.window = dedup.get("window", bsb.dedup.window)
+    bsb.dedup.heartbeat = dedup.get("heartbeat", bsb.dedup.heartbeat)
+    bsb.dedup.windows.update(dedup.get("messages", {}))
+    refresh = config.get("refresh", {})
+    bsb.scheduler.max_duty = refresh.get("max_duty", bsb.scheduler.max_duty)
+    bsb.scheduler.jitter = refresh.get("jitter", bsb.scheduler.jitter)
+    bsb.passive = refresh.get("passive", bsb.passive)
+    cache = config.get("cache", {})
+    bsb.cache.default_max_age = cache.get("max_age", bsb.cache.default_max_age)
+    bsb.cache.max_age.update({messages_by_name[k]: v for k, v in cache.get("messages", {}).items()})
     bsb.set_monitored(monitored_msgs)
 
-    bsb.loggers.append(MyBsbHandler(bsb).bsb_log_handler)
+    bsb.loggers.append(MyBsbHandler().bsb_log_handler)
     log = ThreadHttpLogServer(MyLogger(bsb))
 
     bsb.start()
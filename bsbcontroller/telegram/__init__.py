@@ -1,6 +1,8 @@
 from .telegram import Telegram, CrcError
 from .types import Command, Flag
 from .message import Message
+from .record import TelegramRecord
+from .crc import check_frames, check_frames_array
 
 
-__all__ = ["Telegram", "Command", "Flag", "Message", "CrcError"]
+__all__ = ["Telegram", "TelegramRecord", "Command", "Flag", "Message", "CrcError", "check_frames", "check_frames_array"]
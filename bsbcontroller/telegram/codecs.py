@@ -0,0 +1,216 @@
+import inspect
+import datetime
+import threading
+from collections import OrderedDict
+from struct import Struct
+from typing import Any, Type
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from . import fields as f
+from .message import Message
+
+
+# Decoders take the data part of the telegram as bytes
+Decoder = Callable[[bytes], Any]
+Encoder = Callable[[Any], list[int]]
+
+
+@dataclass(frozen=True)
+class Codec:
+    """ Decode/encode functions specialised for one field type """
+    fields: Type[f.Field]
+    dec: Decoder
+    enc: Encoder
+
+
+S16 = Struct("!h")
+U16 = Struct("!H")
+
+# Plan slots are in 10 minute steps, values over a day wrap around
+SLOT_TIMES = tuple(datetime.time(*divmod(10 * i % (24 * 60), 60)) for i in range(256))
+
+
+def _plan(d: bytes, offset: int = 0) -> f.Plan:
+    times = SLOT_TIMES
+    return f.Plan(tuple(None if d[i] == 0xFF else (times[d[i]], times[d[i + 1]]) for i in range(offset, offset + 6, 2)))
+
+
+def _compile_temp(cls: Type[f.Field]) -> Codec:
+    unpack_from, pack = S16.unpack_from, S16.pack
+
+    def dec(d: bytes) -> float:
+        return unpack_from(d)[0] / 64
+
+    def enc(value: float | None) -> list[int]:
+        return list(pack(0 if value is None else int(value * 64)))
+    return Codec(cls, dec, enc)
+
+
+def _compile_float10(cls: Type[f.Field]) -> Codec:
+    unpack_from, pack = U16.unpack_from, U16.pack
+
+    def dec(d: bytes) -> float:
+        return unpack_from(d)[0] / 10.0
+
+    def enc(value: float) -> list[int]:
+        return list(pack(int(value * 10)))
+    return Codec(cls, dec, enc)
+
+
+def _compile_pct2(cls: Type[f.Field]) -> Codec:
+    unpack_from = U16.unpack_from
+
+    def dec(d: bytes) -> float:
+        return unpack_from(d)[0] / 100.0
+    return Codec(cls, dec, cls.enc)
+
+
+def _compile_int(cls: Type[f.Int]) -> Codec:
+    st = Struct(f"!{cls.char}")
+    unpack_from, pack = st.unpack_from, st.pack
+
+    def dec(d: bytes) -> int:
+        return unpack_from(d)[0]
+
+    def enc(value: int) -> list[int]:
+        return list(pack(value))
+    return Codec(cls, dec, enc)
+
+
+def _compile_onoff(cls: Type[f.Field]) -> Codec:
+    def dec(d: bytes) -> bool:
+        return d[0] > 0
+
+    def enc(value: bool) -> list[int]:
+        return [1 if value else 0]
+    return Codec(cls, dec, enc)
+
+
+def _compile_enum(cls: Type[f.Enum]) -> Codec:
+    values, offset, unknown = dict(cls.values), cls.offset, cls.unknown
+    rev = {v: k for k, v in values.items()}
+
+    if inspect.isclass(unknown) and issubclass(unknown, Exception):
+        exc = unknown
+
+        def dec(d: bytes) -> Any:
+            try:
+                return values[d[offset]]
+            except KeyError:
+                raise exc
+    else:
+        def dec(d: bytes) -> Any:
+            return values.get(d[offset], unknown)
+
+    def enc(value: Any) -> list[int]:
+        return [rev[value]]
+    return Codec(cls, dec, enc)
+
+
+def _compile_plan(cls: Type[f.Field]) -> Codec:
+    return Codec(cls, _plan, cls.enc)
+
+
+def _compile_stathw(cls: Type[f.Field]) -> Codec:
+    s16, u16 = S16.unpack_from, U16.unpack_from
+
+    def dec(d: bytes) -> f.StatHW:
+        return f.StatHW(bool(d[10] & 0x08), s16(d)[0] / 64, u16(d, 2)[0] / 10.0, _plan(d, 4))
+    return Codec(cls, dec, cls.enc)
+
+
+def _compile_hcstat(cls: Type[f.Field]) -> Codec:
+    opmode = _compile_enum(f.OpMode).dec
+    current_values = f.HCStat.current_values
+
+    def dec(d: bytes) -> f.HCStat:
+        return f.HCStat(opmode(d), current_values.get(d[1], 'unknown'), _plan(d, 2), d[8] == 0x02)
+    return Codec(cls, dec, cls.enc)
+
+
+def _compile_generic(cls: Type[f.Field]) -> Codec:
+    def dec(d: bytes) -> Any:
+        return cls.dec(list(d))
+    return Codec(cls, dec, cls.enc)
+
+
+_compilers: dict[Type[f.Field], Callable[[Any], Codec]] = {
+    f.Temp: _compile_temp,
+    f.Float10: _compile_float10,
+    f.Pct2: _compile_pct2,
+    f.OnOff: _compile_onoff,
+    f.Plan: _compile_plan,
+    f.StatHW: _compile_stathw,
+    f.HCStat: _compile_hcstat,
+}
+
+_codecs: dict[Type[f.Field], Codec] = {}
+
+
+def compile_codec(cls: Type[f.Field]) -> Codec:
+    compiler = _compilers.get(cls)
+    if compiler is not None:
+        return compiler(cls)
+    if issubclass(cls, f.Enum):
+        return _compile_enum(cls)
+    if issubclass(cls, f.Int):
+        return _compile_int(cls)
+    return _compile_generic(cls)
+
+
+def codec_for(cls: Type[f.Field]) -> Codec:
+    codec = _codecs.get(cls)
+    if codec is None:
+        codec = _codecs[cls] = compile_codec(cls)
+    return codec
+
+
+class DecodeCache(object):
+    """ Bounded LRU cache of decoded values keyed by message and data
+
+    Most of the bus traffic repeats the same payloads, so the decoded value
+    is shared between telegrams. Values which fail to decode are not cached.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[tuple[Message, bytes], Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, msg: Message, codec: Codec, data: bytes) -> Any:
+        key = (msg, data)
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                pass
+            else:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return value
+
+        value = codec.dec(data)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = value
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "maxsize": self.maxsize,
+        }
+
+
+decode_cache = DecodeCache()
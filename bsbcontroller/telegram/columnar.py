@@ -0,0 +1,165 @@
+""" Bulk decoding of captured telegrams into NumPy columns
+
+Requires the optional numpy dependency.
+"""
+import logging
+from typing import Any, Optional, Type
+from collections.abc import Mapping
+
+import numpy as np
+
+from . import fields as f
+from .types import Command, Flag
+from .message import Message, lookup_message
+from .crc import check_frames_array
+from .codecs import codec_for
+
+
+logger = logging.getLogger("BSB")
+
+Columns = dict[str, np.ndarray]
+
+HEADER_LEN = 9
+
+# Fixed-layout numeric fields: (data size, signed, divisor)
+numeric_fields: dict[Type[f.Field], tuple[int, bool, float]] = {
+    f.Temp: (2, True, 64),
+    f.Int8: (1, False, 1),
+    f.Int16: (2, False, 1),
+    f.Int32: (4, False, 1),
+    f.Float10: (2, False, 10.0),
+    f.Pct2: (2, False, 100.0),
+    f.OnOff: (1, False, 1),
+}
+
+
+def frame_offsets(buf: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """ Find frames in a buffer of concatenated raw frames, skipping garbage up to the next SOF """
+    SOF = 0xDC
+    offsets, lengths = [], []
+    pos, end = 0, len(buf)
+    while pos + 4 <= end:
+        length = buf[pos + 3]
+        if buf[pos] != SOF or length < HEADER_LEN + 2 or pos + length > end:
+            pos = buf.find(SOF, pos + 1)
+            if pos < 0:
+                break
+            continue
+        offsets.append(pos)
+        lengths.append(length)
+        pos += length
+    return np.array(offsets, dtype=np.intp), np.array(lengths, dtype=np.intp)
+
+
+def frame_matrix(buf: bytes, offsets: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """ One frame per row, zero-padded to the longest frame """
+    data = np.frombuffer(buf, dtype=np.uint8)
+    width = int(lengths.max(initial=0))
+    cols = np.arange(width)
+    idx = offsets[:, None] + cols[None, :]
+    mask = cols[None, :] < lengths[:, None]
+    return np.where(mask, data[np.minimum(idx, max(len(data) - 1, 0))], 0).astype(np.uint8)
+
+
+def _be_uint(mat: np.ndarray, rows: np.ndarray, start: np.ndarray, size: int) -> np.ndarray:
+    val = np.zeros(len(rows), dtype=np.int64)
+    for i in range(size):
+        val = (val << 8) | mat[rows, start + i]
+    return val
+
+
+def _decode_values(mat: np.ndarray, lengths: np.ndarray, rows: np.ndarray, cmd: np.ndarray, msg: Message) -> np.ndarray:
+    cmd = cmd[rows]
+    rawlen = lengths[rows] - HEADER_LEN - 2
+
+    # Data position within rawdata, see Telegram._data_bounds
+    head = ((cmd == Command.NAK) | (cmd == Command.ERR) | bool(msg.flags & Flag.FB)) & (rawlen > 0)
+    tail = ~head & bool(msg.flags & Flag.LB) & (cmd == Command.INF) & (rawlen > 0)
+    start = HEADER_LEN + head.astype(np.intp)
+    size = rawlen - head - tail
+
+    null = np.zeros(len(rows), dtype=bool)
+    if msg.flags & Flag.FB:
+        null = (cmd == Command.ANS) & (rawlen > 0) & (mat[rows, HEADER_LEN] == 0x01)
+
+    numeric = numeric_fields.get(msg.fields) if msg.fields is not None else None
+    if numeric is not None:
+        nbytes, signed, divisor = numeric
+        valid = (size >= nbytes) & ~null
+        val = _be_uint(mat, rows, np.where(valid, start, HEADER_LEN), nbytes)
+        if signed:
+            val = np.where(val >= 1 << (8 * nbytes - 1), val - (1 << (8 * nbytes)), val)
+        if msg.fields is f.OnOff:
+            val = (val > 0).astype(np.int64)
+        return np.where(valid, val / divisor, np.nan)
+
+    values = np.full(len(rows), None, dtype=object)
+    if msg.fields is None:
+        return values
+
+    # Non-numeric fields are decoded one by one with the regular codecs
+    dec = codec_for(msg.fields).dec
+    for i, row in enumerate(rows):
+        if null[i] or size[i] <= 0:
+            continue
+        try:
+            values[i] = dec(mat[row, start[i]:start[i] + size[i]].tobytes())
+        except Exception:
+            pass
+    return values
+
+
+def decode_capture(buf: bytes, messages_by_id: Mapping[int, Message], timestamps: Optional[Any] = None) -> dict[str, Columns]:
+    """ Decode a buffer of concatenated raw frames into columns per message name
+
+    Each message gets NumPy arrays of the same length: timestamp, src, dst, cmd, param, value.
+    The value is float64 (NaN for null/missing) for the fixed-layout numeric fields,
+    otherwise an object array of values decoded by the regular codecs.
+    Frames with bad CRC are dropped.
+    """
+    offsets, lengths = frame_offsets(buf)
+    if timestamps is None:
+        ts = np.full(len(offsets), np.nan)
+    else:
+        ts = np.asarray(timestamps, dtype=np.float64)
+        if len(ts) != len(offsets):
+            raise ValueError(f"got {len(ts)} timestamps for {len(offsets)} frames")
+
+    mat = frame_matrix(buf, offsets, lengths)
+    valid = check_frames_array(mat, lengths)
+    if not valid.all():
+        logger.warning(f"decode_capture: {int((~valid).sum())} frames with bad CRC dropped")
+        mat, lengths, ts = mat[valid], lengths[valid], ts[valid]
+
+    src = mat[:, 1] & 0x7F
+    dst = mat[:, 2]
+    cmd = mat[:, 4]
+    param = _be_uint(mat, np.arange(len(mat)), np.full(len(mat), 5), 4)
+    swap = (cmd == Command.QUR) | (cmd == Command.SET)
+    swapped = ((param & 0x00ff0000) << 8) | ((param & 0xff000000) >> 8) | (param & 0xffff)
+    param = np.where(swap, swapped, param)
+
+    groups: dict[str, list[tuple[np.ndarray, np.ndarray]]] = {}
+    params, inverse = np.unique(param, return_inverse=True)
+    by_param = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[by_param], np.arange(len(params) + 1))
+    for i, p in enumerate(params):
+        rows = by_param[bounds[i]:bounds[i + 1]]
+        msg = lookup_message(messages_by_id, int(p))
+        groups.setdefault(msg.name, []).append((rows, _decode_values(mat, lengths, rows, cmd, msg)))
+
+    ret: dict[str, Columns] = {}
+    for name, parts in groups.items():
+        rows = np.concatenate([r for r, _ in parts])
+        values = np.concatenate([v for _, v in parts])
+        order = np.argsort(rows, kind="stable")
+        rows = rows[order]
+        ret[name] = {
+            "timestamp": ts[rows],
+            "src": src[rows],
+            "dst": dst[rows],
+            "cmd": cmd[rows],
+            "param": param[rows].astype(np.uint32),
+            "value": values[order],
+        }
+    return ret
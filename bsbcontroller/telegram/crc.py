@@ -0,0 +1,78 @@
+from collections.abc import Iterable
+from typing import Any
+
+
+POLY = 0x1021
+
+
+def crc16_reference(raw: bytes) -> int:
+    """ Bit-by-bit CRC-CCITT (XModem), kept as the reference implementation """
+    crcval = 0
+    for byte in raw:
+        crcval = (crcval ^ (byte << 8)) & 0xffff
+        for bit in range(8):
+            if crcval & 0x8000:
+                crcval = (crcval << 1) ^ POLY
+            else:
+                crcval <<= 1
+            crcval &= 0xffff
+    return crcval
+
+
+def _make_table() -> tuple[int, ...]:
+    table = []
+    for i in range(256):
+        crcval = i << 8
+        for bit in range(8):
+            crcval = ((crcval << 1) ^ POLY) if crcval & 0x8000 else (crcval << 1)
+            crcval &= 0xffff
+        table.append(crcval)
+    return tuple(table)
+
+
+CRC_TABLE = _make_table()
+
+
+def crc16(raw: bytes | bytearray | memoryview) -> int:
+    crcval = 0
+    table = CRC_TABLE
+    for byte in raw:
+        crcval = ((crcval << 8) & 0xffff) ^ table[(crcval >> 8) ^ byte]
+    return crcval
+
+
+def check_frame(raw: bytes | bytearray | memoryview) -> bool:
+    # CRC over the whole frame including the big-endian CRC field leaves zero
+    return len(raw) > 2 and crc16(raw) == 0
+
+
+def check_frames(frames: Iterable[bytes | bytearray | memoryview]) -> list[bool]:
+    return [check_frame(raw) for raw in frames]
+
+
+def check_frames_array(frames: Any, lengths: Any = None) -> Any:
+    """ Vectorised CRC check of many frames at once
+
+    `frames` is a 2D uint8 NumPy array with one frame per row, zero-padded on the right.
+    Frame lengths are taken from the length byte of each frame unless `lengths` is given.
+    Returns a boolean array with True for frames with valid CRC.
+    """
+    import numpy as np
+
+    frames = np.asarray(frames, dtype=np.uint8)
+    if frames.ndim != 2:
+        raise ValueError("frames must be a 2D array")
+
+    n, width = frames.shape
+    if lengths is None:
+        lengths = frames[:, 3] if width > 3 else np.zeros(n, dtype=np.uint8)
+    lengths = np.asarray(lengths, dtype=np.intp)
+
+    table = np.array(CRC_TABLE, dtype=np.uint16)
+    crcval = np.zeros(n, dtype=np.uint16)
+    for col in range(min(width, int(lengths.max(initial=0)))):
+        active = lengths > col
+        nxt = (crcval << 8) ^ table[(crcval >> 8) ^ frames[:, col]]
+        crcval = np.where(active, nxt, crcval)
+
+    return (crcval == 0) & (lengths > 2) & (lengths <= width)
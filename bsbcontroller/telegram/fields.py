@@ -52,7 +52,7 @@ class Enum(Field):
     offset = 0
     unknown: str | Type[Exception] = "unknown"
 
-    _values_rev = None
+    _values_rev: Optional[dict[Any, int]] = None
 
     @classmethod
     def dec(cls, data: list[int]) -> Any:
@@ -63,9 +63,11 @@ class Enum(Field):
 
     @classmethod
     def enc(cls, value: Any) -> list[int]:
-        if cls._values_rev is None:
-            cls._values_rev = dict((v, k) for k, v in cls.values.items())
-        return [cls._values_rev[value]]
+        # Look up the class' own map, a subclass must not reuse the parent's one
+        values_rev = cls.__dict__.get("_values_rev")
+        if values_rev is None:
+            values_rev = cls._values_rev = dict((v, k) for k, v in cls.values.items())
+        return [values_rev[value]]
 
 
 class Enable(Enum):
@@ -202,9 +204,10 @@ class StatB(Field):
         return "Burner: {0}".format(2 if data[0] & 0x10 else (1 if data[0] & 0x04 else 0))
 
 
-@dataclass
+# Decoded values are cached and shared between telegrams, so they are immutable
+@dataclass(frozen=True)
 class Plan(Field):
-    plan: list[Optional[tuple[datetime.time, datetime.time]]]
+    plan: tuple[Optional[tuple[datetime.time, datetime.time]], ...]
 
     def __str__(self) -> str:
         return " ".join(["{0}-{1}".format(p[0].strftime("%H:%M"), p[1].strftime("%H:%M")) if p is not None else "" for p in self.plan])
@@ -219,10 +222,10 @@ class Plan(Field):
                 time1 = (datetime.datetime.fromtimestamp(0, datetime.UTC) + datetime.timedelta(minutes=(10 * data[i + 0]))).time()
                 time2 = (datetime.datetime.fromtimestamp(0, datetime.UTC) + datetime.timedelta(minutes=(10 * data[i + 1]))).time()
                 plan.append((time1, time2))
-        return cls(plan)
+        return cls(tuple(plan))
 
 
-@dataclass
+@dataclass(frozen=True)
 class StatHW(Field):
     stby: bool
     outdoor_temp: float
@@ -242,7 +245,7 @@ class StatHW(Field):
         )
 
 
-@dataclass
+@dataclass(frozen=True)
 class HCStat(Field):
     mode: str
     current: str
@@ -1,5 +1,7 @@
+import sys
 from dataclasses import dataclass
 from typing import Optional, Type
+from collections.abc import Callable, Mapping
 from .types import Flag
 
 from . import fields as f
@@ -12,5 +14,31 @@ class Message:
     fields: Optional[Type[f.Field]]
     name: str
 
+    def __post_init__(self) -> None:
+        # Names are shared by all telegrams (and records) of the message
+        object.__setattr__(self, "name", sys.intern(self.name))
+
     def __repr__(self) -> str:
         return f"Message({self.name})"
+
+
+_unknown: dict[int, Message] = {}
+
+
+def unknown_message(param: int) -> Message:
+    """ Placeholder for a param without definition, shared by all its telegrams """
+    msg = _unknown.get(param)
+    if msg is None:
+        if len(_unknown) >= 1024:
+            _unknown.clear()
+        msg = _unknown[param] = Message(param, Flag.FB, None, "unknown")
+    return msg
+
+
+def lookup_message(messages_by_id: Mapping[int, Message], param: int) -> Message:
+    """ Message of a param received, an index with lookup() (the catalog's) also matches by row """
+    lookup: Optional[Callable[[int], Message]] = getattr(messages_by_id, "lookup", None)
+    if lookup is not None:
+        return lookup(param)
+    msg = messages_by_id.get(param)
+    return unknown_message(param) if msg is None else msg
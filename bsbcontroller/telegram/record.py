@@ -0,0 +1,86 @@
+import time
+from typing import Any, NoReturn
+
+from .types import Command
+from .message import Message
+from .telegram import Telegram
+
+
+class TelegramRecord(object):
+    """ Compact immutable record of a telegram for long-lived logs
+
+    Keeps only the raw frame, the timestamp and the message definition,
+    everything else is derived from the frame on demand.
+    """
+    __slots__ = ("frame", "timestamp", "msg")
+
+    frame: bytes
+    timestamp: float
+    msg: Message
+
+    def __init__(self, frame: bytes, timestamp: float, msg: Message):
+        object.__setattr__(self, "frame", frame)
+        object.__setattr__(self, "timestamp", timestamp)
+        object.__setattr__(self, "msg", msg)
+
+    @classmethod
+    def from_telegram(cls, telegram: Telegram) -> "TelegramRecord":
+        return cls(telegram.to_raw(), telegram.timestamp, telegram.msg)
+
+    def __setattr__(self, name: str, value: Any) -> NoReturn:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> NoReturn:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TelegramRecord):
+            return NotImplemented
+        return self.frame == other.frame and self.timestamp == other.timestamp and self.msg == other.msg
+
+    def __hash__(self) -> int:
+        return hash((self.frame, self.timestamp))
+
+    def __repr__(self) -> str:
+        return f"TelegramRecord({self.msg.name}, {self.frame.hex()})"
+
+    def telegram(self) -> Telegram:
+        frame = self.frame
+        t = Telegram(self.msg, frame[9:-2], Command(frame[4]), frame[2], frame[1] & 0x7F, self.timestamp, override=False)
+        t._raw = frame
+        return t
+
+    def __str__(self) -> str:
+        return str(self.telegram())
+
+    @property
+    def src(self) -> int:
+        return self.frame[1] & 0x7F
+
+    @property
+    def dst(self) -> int:
+        return self.frame[2]
+
+    @property
+    def cmd(self) -> Command:
+        return Command(self.frame[4])
+
+    @property
+    def param(self) -> int:
+        return self.msg.param
+
+    @property
+    def name(self) -> str:
+        return self.msg.name
+
+    @property
+    def time(self) -> str:
+        return time.strftime("%d.%m. %H:%M:%S", time.localtime(self.timestamp))
+
+    @property
+    def data(self) -> list[int]:
+        return self.telegram().data
+
+    @property
+    def value(self) -> Any:
+        return self.telegram().value
@@ -1,11 +1,15 @@
+import time
 import struct
 import datetime
 import logging
 import traceback
 
 from typing import Any
+from collections.abc import Mapping
 from .types import Command, Flag
-from .message import Message
+from .message import Message, lookup_message
+from .crc import crc16, check_frame
+from .codecs import codec_for, decode_cache
 #from .messages import messages, rows
 
 
@@ -34,22 +38,16 @@ class Telegram(object):
     DEF_SRC = 0x42
     DEF_DST = 0x00
 
-    @staticmethod
-    def _crc(raw: bytes) -> int:
-        crcval = 0
-        for byte in raw:
-            crcval = (crcval ^ (byte << 8)) & 0xffff
-            for bit in range(8):
-                if crcval & 0x8000:
-                    crcval = (crcval << 1) ^ 0x1021
-                else:
-                    crcval <<= 1
-                crcval &= 0xffff
-        return crcval
+    _raw: bytes | None
+    _data: list[int] | None
+    _str: str | None
+
+    # Table-driven CRC; the bitwise crc16_reference is kept in the crc module
+    _crc = staticmethod(crc16)
 
     @classmethod
-    def from_raw(cls, raw: bytes, messages_by_id: dict[int, Message], timestamp: datetime.datetime | None = None) -> "Telegram":
-        if cls._crc(raw[0:-2]) != struct.unpack("!H", raw[-2:])[0]:
+    def from_raw(cls, raw: bytes, messages_by_id: Mapping[int, Message], timestamp: datetime.datetime | float | None = None) -> "Telegram":
+        if not check_frame(raw):
             raise CrcError
 
         sof, src, dst, length, cmd = raw[:5]
@@ -61,14 +59,20 @@ class Telegram(object):
         #assert sof == cls.SOF
         #assert cmd in set(Command)
         #assert length == len(raw)
-        msg = messages_by_id.get(param)
-        if msg is None:
-            msg = Message(param, Flag.FB, None, "unknown")
+        msg = lookup_message(messages_by_id, param)
 
         self = cls(msg, rawdata, cmd, dst, src & 0x7F, timestamp, override=False)
+        # Keep the received frame for echo comparison, unless the stored data were patched
+        if self._rawdata is rawdata:
+            self._raw = bytes(raw)
         return self
 
     def to_raw(self) -> bytes:
+        if self._raw is None:
+            self._raw = self._encode()
+        return self._raw
+
+    def _encode(self) -> bytes:
         param = swap_flags(self._param) if self._cmd in [Command.QUR, Command.SET] else self._param
 
         raw = bytearray([self.SOF, self._src | 0x80, self._dst, 0x0, self._cmd])
@@ -78,11 +82,12 @@ class Telegram(object):
         raw += struct.pack("!H", self._crc(raw))
         return bytes(raw)
 
-    def __init__(self, msg: Message, rawdata: bytes = bytes(), cmd: Command = Command.QUR, dst: int = DEF_DST, src: int = DEF_SRC, timestamp: datetime.datetime | None = None, override: bool = True):
+    def __init__(self, msg: Message, rawdata: bytes = bytes(), cmd: Command = Command.QUR, dst: int = DEF_DST, src: int = DEF_SRC, timestamp: datetime.datetime | float | None = None, override: bool = True):
         if timestamp is None:
-            timestamp = datetime.datetime.now()
-        #self._time = timestamp.ctime()[4:-5]
-        self._time = timestamp.strftime("%d.%m. %H:%M:%S")
+            timestamp = time.time()
+        elif isinstance(timestamp, datetime.datetime):
+            timestamp = timestamp.timestamp()
+        self._timestamp = timestamp
         self._rawdata = rawdata
         self._msg = msg
         self._cmd = cmd
@@ -91,6 +96,12 @@ class Telegram(object):
         self._value: Any = None
         self._flags = bytes()
         self._index = None
+        self._raw = None
+
+        # Data, value and text are decoded on first access
+        self._data = None
+        self._value_valid = False
+        self._str = None
 
         #msg_default = (Flag.FB, None, "unknown")
         #msg = messages.get(self._param, msg_default)
@@ -119,14 +130,13 @@ class Telegram(object):
         if not override and self._param in [0x3d2d0215] and len(self._rawdata) == 2:
             self._rawdata += b"\xbe"
 
-        self._rawdata2data()
-        self._update_value()
-
     def set_value(self, value: Any) -> bool:
         try:
             if self._datatype is None:
                 raise Exception("Can't set telegram with no value type")
-            self._data = self._datatype.enc(value)
+            if self._data is None:
+                self._rawdata2data()
+            self._data = codec_for(self._datatype).enc(value)
 
             if self._intflags & Flag.FB:
                 #assert self.cmd == Command.SET
@@ -136,8 +146,9 @@ class Telegram(object):
                 #assert self.cmd == Command.INF
                 self._flags = bytes([0]) # TODO: Check this
 
-            self._update_value()
             self._data2rawdata()
+            self._raw = None
+            self._update_value()
 
         except Exception as e:
             logger.error(f"Telegram.set_value error: {e}, {self} {self.msg.fields}")
@@ -145,38 +156,45 @@ class Telegram(object):
             return False
         return True
 
-    def _rawdata2data(self) -> None:
-        rd = list(self._rawdata)
-        f, d = [], rd
-
+    def _data_bounds(self) -> tuple[int, int]:
+        # Position of the data within rawdata, the rest are flags
+        rd = self._rawdata
         if rd:
-            if self.cmd in [Command.NAK, Command.ERR]:
-                f, d = rd[:1], rd[1:]
-            if self._intflags & Flag.FB:
-                f, d = rd[:1], rd[1:]
+            if self.cmd in [Command.NAK, Command.ERR] or self._intflags & Flag.FB:
+                return 1, len(rd)
             elif self._intflags & Flag.LB and self.cmd in [Command.INF]:
-                f, d = rd[-1:], rd[:-1]
-        self._flags, self._data = bytes(f), d
+                return 0, len(rd) - 1
+        return 0, len(rd)
+
+    def _rawdata2data(self) -> None:
+        rd = self._rawdata
+        start, end = self._data_bounds()
+        self._flags, self._data = rd[:start] + rd[end:], list(rd[start:end])
 
     def _data2rawdata(self) -> None:
         rd = bytes()
         if Flag.FB in self._intflags:
             rd += self._flags
-        rd += bytes(self._data)
+        rd += bytes(self.data)
         if Flag.LB in self._intflags:
             rd += self._flags
         self._rawdata = rd
 
     def _update_value(self) -> None:
-        if self._data and self._datatype is not None:
+        self._value = None
+        self._value_valid = True
+        self._str = None
+        start, end = self._data_bounds()
+        if start < end and self._datatype is not None:
+            rd = self._rawdata
             try:
-                self._value = self._datatype.dec(self.data)
+                self._value = decode_cache.decode(self._msg, codec_for(self._datatype), rd[start:end])
                 nullable = False
                 nullable |= bool(self._intflags & Flag.FB) and self.cmd in [Command.ANS, Command.SET]
                 #nullable |= bool(self._intflags & Flag.LB) and self.cmd in [Command.INF]
                 if nullable:
-                    assert len(self._flags) == 1
-                    if (self._flags[0] == 0x01 and self.cmd == Command.ANS):  # TODO: Command.SET ?
+                    assert start == 1
+                    if (rd[0] == 0x01 and self.cmd == Command.ANS):  # TODO: Command.SET ?
                         self._value = None
             except Exception as e:
                 logger.error(f"Telegram.get_value error: {e}, {self}")
@@ -184,16 +202,21 @@ class Telegram(object):
                 logger.error(traceback.format_exc())
 
     def __str__(self) -> str:
+        if self._str is None:
+            self._str = self._format()
+        return self._str
+
+    def _format(self) -> str:
         src = addr_text.get(self._src, f"{self._src:02X}")
         dst = addr_text.get(self._dst, f"{self._dst:02X}")
 
         cmd = Command(self.cmd).name if self.cmd in set(Command) else 'UNK'
         text = self._name
         #text = message_text.get(self._name, self._name)
-        value = str(self._value) if self._value is not None else ""
+        value = str(self.value) if self.value is not None else ""
 
-        base = f"{self._time} {src:<2}=>{dst:>2} {cmd} 0x{self._param:08x} {text:<25.25} {value:<20}"
-        data = " ".join("{:02x}".format(x) for x in self._data)
+        base = f"{self.time} {src:<2}=>{dst:>2} {cmd} 0x{self._param:08x} {text:<25.25} {value:<20}"
+        data = " ".join("{:02x}".format(x) for x in self.data)
         if self._intflags & Flag.FB and self._flags:
             data = f"|{self._flags[0]:02x}|{data}|"
         elif self._intflags & Flag.LB and self._flags:
@@ -202,6 +225,14 @@ class Telegram(object):
             data = f"   |{data}|"
         return f"{base} {data}"
 
+    @property
+    def timestamp(self) -> float:
+        return self._timestamp
+
+    @property
+    def time(self) -> str:
+        return time.strftime("%d.%m. %H:%M:%S", time.localtime(self._timestamp))
+
     @property
     def src(self) -> int:
         return self._src
@@ -224,6 +255,9 @@ class Telegram(object):
 
     @property
     def data(self) -> list[int]:
+        if self._data is None:
+            self._rawdata2data()
+        assert self._data is not None
         return self._data
 
     @property
@@ -232,6 +266,8 @@ class Telegram(object):
 
     @property
     def value(self) -> Any:
+        if not self._value_valid:
+            self._update_value()
         return self._value
 
     @property
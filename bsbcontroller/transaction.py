@@ -0,0 +1,116 @@
+import time
+from typing import Optional
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from .telegram import Telegram, Command, Message
+
+
+@dataclass
+class Transaction:
+    """ One bus transaction with timestamps of its phases (time.monotonic) """
+    msg: Message
+    cmd: Command
+    queued: float
+    started: float = 0.
+    sent: float = 0.
+    echoed: float = 0.
+    answered: float = 0.
+    answer: Optional[Telegram] = None
+    deadline: float = 0.
+    # Called by the monitor thread when the transaction is answered or timed out
+    done: Optional[Callable[["Transaction"], None]] = field(default=None, repr=False)
+
+    def start(self) -> None:
+        self.started = time.monotonic()
+
+    def transmitted(self, echo_time: float) -> None:
+        self.echoed = time.monotonic()
+        self.sent = max(self.started, self.echoed - echo_time)
+
+    def finish(self, answer: Optional[Telegram]) -> None:
+        self.answered = time.monotonic()
+        self.answer = answer
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return {
+            "queue": self.started - self.queued,
+            "send": self.sent - self.started,
+            "echo": self.echoed - self.sent,
+            "answer": self.answered - self.echoed if self.answered else 0.,
+        }
+
+    def __str__(self) -> str:
+        timings = " ".join(f"{k}: {v * 1000:.0f}ms" for k, v in self.timings.items())
+        return f"{Command(self.cmd).name} {self.msg.name}: {timings}{'' if self.answer is not None or not self.answered else ' (no answer)'}"
+
+
+class TransactionTable(object):
+    """ Sent telegrams waiting for an answer
+
+    Up to window transactions can be outstanding at a time. Answers (ANS, ACK, NAK, ERR)
+    are matched by (param, src, dst), transactions with the same key are answered in order.
+    A QIN is answered by an INF, which may be a broadcast.
+    """
+    ANSWERS = (Command.ANS, Command.ACK, Command.NAK, Command.ERR)
+
+    def __init__(self, window: int = 1, timeout: float = 2.0):
+        self.window = window
+        self.timeout = timeout
+
+        self._pending: dict[tuple[int, int, int], deque[Transaction]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def full(self) -> bool:
+        return self._count >= self.window
+
+    def add(self, tr: Transaction, telegram: Telegram) -> None:
+        tr.deadline = time.monotonic() + self.timeout
+        key = (telegram.msg.param, telegram.src, telegram.dst)
+        self._pending.setdefault(key, deque()).append(tr)
+        self._count += 1
+
+    def resolve(self, telegram: Telegram) -> Optional[Transaction]:
+        """ Finish the transaction answered by the telegram, None if it answers nothing pending """
+        key: Optional[tuple[int, int, int]]
+        if telegram.cmd in self.ANSWERS:
+            key = (telegram.msg.param, telegram.dst, telegram.src)
+        elif telegram.cmd == Command.INF:
+            param, src = telegram.msg.param, telegram.src
+            key = next((k for k, p in self._pending.items() if k[0] == param and k[2] == src and p[0].cmd == Command.QIN), None)
+        else:
+            return None
+
+        pending = self._pending.get(key) if key is not None else None
+        if key is None or not pending:
+            return None
+
+        tr = self._pop(key, pending)
+        tr.finish(telegram)
+        return tr
+
+    def expire(self, now: float) -> list[Transaction]:
+        """ Finish the transactions not answered in time """
+        expired = []
+        for key, pending in list(self._pending.items()):
+            while pending and pending[0].deadline <= now:
+                tr = self._pop(key, pending)
+                tr.finish(None)
+                expired.append(tr)
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        return min((pending[0].deadline for pending in self._pending.values()), default=None)
+
+    def _pop(self, key: tuple[int, int, int], pending: deque[Transaction]) -> Transaction:
+        tr = pending.popleft()
+        if not pending:
+            del self._pending[key]
+        self._count -= 1
+        return tr
@@ -0,0 +1,56 @@
+""" Memory needed per retained telegram: full Telegram objects vs. TelegramRecord
+
+Run with: python -m bsbcontroller.utils.membench [count]
+"""
+import sys
+import random
+import logging
+import tracemalloc
+from typing import Any, Callable
+
+from ..telegram import Telegram, TelegramRecord, Command
+from ..messages import messages, messages_by_id
+
+
+def sample_frames(count: int) -> list[bytes]:
+    rnd = random.Random(0)
+    frames = []
+    for _ in range(count):
+        msg = rnd.choice(messages)
+        cmd = rnd.choice([Command.INF, Command.ANS, Command.QUR])
+        rawdata = bytes(rnd.randrange(256) for _ in range(0 if cmd == Command.QUR else 3))
+        frames.append(Telegram(msg, rawdata, cmd, override=False).to_raw())
+    return frames
+
+
+def retained_size(frames: list[bytes], convert: Callable[[Telegram], Any]) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    retained = []
+    for raw in frames:
+        t = Telegram.from_raw(raw, messages_by_id)
+        # The HTTP log decodes and formats the telegrams it shows
+        str(t)
+        retained.append(convert(t))
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del retained
+    return size
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    # Random payloads do not always decode
+    logging.getLogger("BSB").setLevel(logging.CRITICAL)
+    frames = sample_frames(count)
+
+    results = {
+        "Telegram": retained_size(frames, lambda t: t),
+        "TelegramRecord": retained_size(frames, TelegramRecord.from_telegram),
+    }
+    for name, size in results.items():
+        print(f"{name:<16} {size / count:8.1f} B/telegram ({count} retained)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,35 @@
+import time
 import queue
+import threading
 from typing import Optional, Any
 
 from ..telegram import Telegram, Command, Flag
 from ..telegram import fields as f
+from ..driver import TxAttempt
 
 
 class TestBsbDriver(object):
     def __init__(self) -> None:
         self._ooo_queue: queue.Queue[Telegram] = queue.Queue()
+        self.last_tx: list[TxAttempt] = []
 
-    def receive_telegram(self, wait: bool = True) -> Optional[Telegram]:
+    def receive_telegram(self, wait: bool = True, deadline: Optional[float] = None, wake: Optional[threading.Event] = None) -> Optional[Telegram]:
         if not self._ooo_queue.empty():
             return self._ooo_queue.get_nowait()
 
-        return self._receive_telegram(wait)
+        return self._receive_telegram(wait, deadline, wake)
 
-    def _receive_telegram(self, wait: bool = True) -> Optional[Telegram]:
+    def _receive_telegram(self, wait: bool = True, deadline: Optional[float] = None, wake: Optional[threading.Event] = None) -> Optional[Telegram]:
+        # Quiet bus
+        if deadline is not None:
+            timeout = max(0., deadline - time.monotonic())
+            if wake is not None:
+                wake.wait(timeout)
+            else:
+                time.sleep(timeout)
         return None
 
-    def send_telegram(self, telegram: Telegram, retries: int = 10) -> bool:
+    def send_telegram(self, telegram: Telegram, retries: Optional[int] = None) -> bool:
         cmd = {
             Command.QUR: Command.ANS,
             Command.SET: Command.ACK,
@@ -43,9 +54,12 @@ class TestBsbDriver(object):
                 # FIXME: this is only for TestBsbDriver
                 if t._intflags & Flag.FB and t.cmd == Command.ANS:
                     t._flags = bytes([1]) if value is None else bytes([0])
+                    t._data2rawdata()
+                    t._raw = None
                 t._update_value()
             elif telegram.cmd == Command.SET:
                 pass
 
             self._ooo_queue.put_nowait(t)
+        self.last_tx = [TxAttempt(0., 0., True, True)]
         return True
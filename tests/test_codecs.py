@@ -0,0 +1,79 @@
+import random
+import datetime
+from typing import Any, Type
+from collections.abc import Callable
+
+import pytest
+
+from bsbcontroller.messages import messages
+from bsbcontroller.telegram import fields as f
+from bsbcontroller.telegram.codecs import codec_for
+
+
+# Data part length of each field type
+SIZES: dict[Type[f.Field], int] = {
+    f.Temp: 2,
+    f.OnOff: 1,
+    f.Pct2: 2,
+    f.Float10: 2,
+    f.Date: 9,
+    f.Error: 2,
+    f.HWater: 2,
+    f.StatB: 4,
+    f.Plan: 6,
+    f.StatHW: 11,
+    f.HCStat: 10,
+    f.Schedule: 12,
+}
+
+FIELD_TYPES = sorted({msg.fields for msg in messages if msg.fields is not None}, key=lambda cls: cls.__name__)
+
+
+def size(cls: Type[f.Field]) -> int:
+    if issubclass(cls, f.Int):
+        return cls.size
+    if issubclass(cls, f.Enum):
+        return cls.offset + 1
+    return SIZES[cls]
+
+
+def outcome(fn: Callable[[Any], Any], arg: Any) -> tuple[str, Any]:
+    try:
+        return "ok", fn(arg)
+    except Exception as e:
+        return "error", type(e)
+
+
+def samples(n: int, count: int = 500) -> list[list[int]]:
+    rnd = random.Random(n)
+    data = [[b] * n for b in (0x00, 0x01, 0x7F, 0x80, 0xFE, 0xFF)]
+    data += [[0x7F, 0xFF] + [0] * (n - 2), [0x80, 0x00] + [0] * (n - 2)] if n >= 2 else []
+    data += [[rnd.randrange(256) for _ in range(n)] for _ in range(count)]
+    return data
+
+
+def test_all_field_types_covered():
+    for cls in FIELD_TYPES:
+        assert size(cls) > 0
+
+
+@pytest.mark.parametrize("cls", FIELD_TYPES, ids=lambda cls: cls.__name__)
+def test_dec_matches_field(cls):
+    dec = codec_for(cls).dec
+    for data in samples(size(cls)):
+        assert outcome(dec, bytes(data)) == outcome(cls.dec, data), data
+
+
+@pytest.mark.parametrize("cls", FIELD_TYPES, ids=lambda cls: cls.__name__)
+def test_enc_matches_field(cls):
+    enc = codec_for(cls).enc
+    values: list[Any] = [None, True, False, 0, 1, -1, 0.05, 21.5, -30.25, 100, 2 ** 31, "", "automatic"]
+    values += [v for kind, v in (outcome(cls.dec, data) for data in samples(size(cls), 100)) if kind == "ok"]
+    if issubclass(cls, f.Enum):
+        values += list(cls.values.values())
+    if cls is f.Date:
+        values += ["2024-02-29 23:59:58", datetime.datetime(2000, 1, 1)]
+    if cls is f.Schedule:
+        values += ["06:00-22:00", "05:30-08:00 16:00-22:10", "00:00-23:59 01:00-02:00 03:00-04:00", "22:00-06:00"]
+    for value in values:
+        assert outcome(enc, value) == outcome(cls.enc, value), value
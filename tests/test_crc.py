@@ -0,0 +1,80 @@
+import random
+
+import pytest
+
+from bsbcontroller.telegram.crc import crc16, crc16_reference, check_frame, check_frames, check_frames_array
+
+
+def make_frame(rnd: random.Random, length: int) -> bytes:
+    """ Random frame of the given total length with the length byte and a valid CRC """
+    body = bytearray(rnd.randrange(256) for _ in range(length - 2))
+    if length > 3:
+        body[3] = length
+    return bytes(body) + crc16(body).to_bytes(2, "big")
+
+
+def corrupt(rnd: random.Random, raw: bytes) -> bytes:
+    # Flip one bit, keep the length byte so the frame is still checked over its full length
+    i = rnd.choice([i for i in range(len(raw)) if i != 3])
+    frame = bytearray(raw)
+    frame[i] ^= 1 << rnd.randrange(8)
+    return bytes(frame)
+
+
+def random_frames(seed: int = 1, count: int = 300) -> list[bytes]:
+    rnd = random.Random(seed)
+    frames = []
+    for _ in range(count):
+        raw = make_frame(rnd, rnd.randrange(11, 33))
+        frames.append(corrupt(rnd, raw) if rnd.random() < 0.5 else raw)
+    return frames
+
+
+def test_crc16_matches_reference():
+    rnd = random.Random(0)
+    data = [b"", b"\x00", b"\xff", b"123456789", bytes(range(256)), bytes(64), b"\xff" * 64]
+    data += [bytes(rnd.randrange(256) for _ in range(rnd.randrange(1, 40))) for _ in range(500)]
+    for raw in data:
+        assert crc16(raw) == crc16_reference(raw), raw
+        assert crc16(bytearray(raw)) == crc16(memoryview(raw)) == crc16_reference(raw)
+    # Known check value of CRC-CCITT (XModem)
+    assert crc16(b"123456789") == 0x31C3
+
+
+def test_check_frame():
+    rnd = random.Random(2)
+    for _ in range(200):
+        raw = make_frame(rnd, rnd.randrange(11, 33))
+        assert check_frame(raw)
+        assert not check_frame(corrupt(rnd, raw))
+    assert not check_frame(b"")
+    assert not check_frame(b"\x00\x00")
+
+
+def test_check_frames_array_matches_scalar():
+    np = pytest.importorskip("numpy")
+
+    frames = random_frames()
+    width = max(len(raw) for raw in frames)
+    array = np.zeros((len(frames), width), dtype=np.uint8)
+    for i, raw in enumerate(frames):
+        array[i, :len(raw)] = list(raw)
+
+    expected = check_frames(frames)
+    assert True in expected and False in expected
+    assert check_frames_array(array).tolist() == expected
+    assert check_frames_array(array, [len(raw) for raw in frames]).tolist() == expected
+
+
+def test_check_frames_array_lengths():
+    np = pytest.importorskip("numpy")
+
+    raw = make_frame(random.Random(3), 12)
+    array = np.zeros((4, 16), dtype=np.uint8)
+    array[:, :12] = list(raw)
+    # Exact, too short, too long, wider than the array
+    result = check_frames_array(array, [12, 11, 13, 20]).tolist()
+    assert result == [True, False, check_frame(raw + b"\x00"), False]
+    assert not check_frames_array(np.zeros((1, 2), dtype=np.uint8)).any()
+    with pytest.raises(ValueError):
+        check_frames_array(np.zeros(8, dtype=np.uint8))
@@ -0,0 +1,100 @@
+import random
+
+from bsbcontroller.driver import FrameParser, INVERT
+from bsbcontroller.telegram import Telegram, Command
+from bsbcontroller.messages import messages_by_name
+
+
+def make_frames() -> list[bytes]:
+    frames = []
+    for name, value in (("boiler_temp", 42.0), ("room1_temp_req", 21.5), ("hc1_operating_mode", "automatic")):
+        telegram = Telegram(messages_by_name[name], cmd=Command.ANS, src=0, dst=Telegram.DEF_SRC)
+        telegram.set_value(value)
+        frames.append(telegram.to_raw())
+    frames.append(Telegram(messages_by_name["outer_temp"]).to_raw())
+    return frames
+
+
+def wire(data: bytes) -> bytes:
+    # As read from the serial port
+    return data.translate(INVERT)
+
+
+def read_all(parser: FrameParser) -> list[bytes]:
+    frames = []
+    while (raw := parser.next_frame()) is not None:
+        frames.append(raw)
+    return frames
+
+
+def test_frames():
+    frames = make_frames()
+    parser = FrameParser()
+    parser.feed(wire(b"".join(frames)))
+    assert read_all(parser) == frames
+    assert len(parser) == 0
+
+
+def test_resync_after_garbage():
+    frames = make_frames()
+    sof = bytes([Telegram.SOF])
+    # Noise, a SOF with an impossible length and a truncated frame
+    garbage = [b"\x00\x13\x37", sof + b"\x00\x00\xff", frames[0][:7], sof]
+    parser = FrameParser()
+    for g, raw in zip(garbage, frames):
+        parser.feed(wire(g + raw))
+    assert read_all(parser) == frames[:len(garbage)]
+
+
+def test_bad_crc_then_good_frame():
+    frames = make_frames()
+    bad = bytearray(frames[0])
+    bad[-1] ^= 0x01
+    parser = FrameParser()
+    parser.feed(wire(bytes(bad) + frames[1]))
+    assert read_all(parser) == [frames[1]]
+
+
+def test_frames_split_across_feeds():
+    frames = make_frames()
+    stream = wire(b"".join(frames))
+    rnd = random.Random(1)
+    for chunk in (1, 2, 5, None):
+        parser = FrameParser()
+        received = []
+        pos = 0
+        while pos < len(stream):
+            n = chunk or rnd.randrange(1, 20)
+            parser.feed(stream[pos:pos + n])
+            pos += n
+            received += read_all(parser)
+        assert received == frames, chunk
+
+
+def test_missing():
+    raw = make_frames()[0]
+    parser = FrameParser()
+    assert parser.missing == 4
+
+    parser.feed(wire(raw[:2]))
+    assert parser.missing == 2
+    assert parser.next_frame() is None
+
+    parser.feed(wire(raw[2:4]))
+    assert parser.missing == len(raw) - 4
+
+    parser.feed(wire(raw[4:-1]))
+    assert parser.missing == 1
+    assert parser.next_frame() is None
+
+    parser.feed(wire(raw[-1:]))
+    assert parser.next_frame() == raw
+    assert parser.missing == 4
+
+
+def test_clear():
+    parser = FrameParser()
+    parser.feed(wire(make_frames()[0][:5]))
+    assert parser.pending
+    parser.clear()
+    assert len(parser) == 0 and parser.next_frame() is None
@@ -0,0 +1,100 @@
+import time
+
+from bsbcontroller.transaction import Transaction, TransactionTable
+from bsbcontroller.telegram import Telegram, Command
+from bsbcontroller.messages import messages_by_name
+
+
+BOILER = 0x00
+OTHER = 0x06 # A thermostat, another bus master
+BROADCAST = 0x7f
+US = Telegram.DEF_SRC
+
+
+def send(table: TransactionTable, name: str, dst: int = BOILER) -> Transaction:
+    telegram = Telegram(messages_by_name[name], dst=dst)
+    tr = Transaction(telegram.msg, telegram.cmd, time.monotonic())
+    table.add(tr, telegram)
+    return tr
+
+
+def answer(name: str, cmd: Command = Command.ANS, src: int = BOILER, dst: int = US) -> Telegram:
+    return Telegram(messages_by_name[name], cmd=cmd, src=src, dst=dst)
+
+
+def test_keyed_by_param_src_dst():
+    table = TransactionTable(window=2)
+    tr = send(table, "boiler_temp")
+    assert len(table) == 1 and not table.full
+
+    # Answers to another device, from another device, of another message, and not an answer
+    assert table.resolve(answer("boiler_temp", dst=OTHER)) is None
+    assert table.resolve(answer("boiler_temp", src=OTHER)) is None
+    assert table.resolve(answer("flue_temp")) is None
+    assert table.resolve(answer("boiler_temp", Command.QUR)) is None
+    assert table.resolve(answer("boiler_temp", Command.INF, dst=BROADCAST)) is None
+    assert len(table) == 1
+
+    ans = answer("boiler_temp")
+    assert table.resolve(ans) is tr
+    assert tr.answer is ans and tr.answered > 0
+    assert len(table) == 0
+    assert table.resolve(answer("boiler_temp")) is None
+
+
+def test_error_answers():
+    table = TransactionTable(window=3)
+    trs = {cmd: send(table, name) for cmd, name in ((Command.NAK, "boiler_temp"), (Command.ERR, "flue_temp"), (Command.ACK, "room1_temp_req"))}
+    assert table.full
+    for cmd, tr in trs.items():
+        assert table.resolve(answer(tr.msg.name, cmd)) is tr
+        assert tr.answer is not None and tr.answer.cmd == cmd
+    assert len(table) == 0
+
+
+def test_qin_answered_by_broadcast_inf():
+    table = TransactionTable(window=2)
+    tr = send(table, "hc2_status_qa")
+    assert tr.cmd == Command.QIN
+    qur = send(table, "boiler_temp")
+
+    # From another device
+    assert table.resolve(answer("hc2_status_qa", Command.INF, src=OTHER, dst=BROADCAST)) is None
+    # Only a QIN is answered by an INF
+    assert table.resolve(answer("boiler_temp", Command.INF, dst=BROADCAST)) is None
+
+    inf = answer("hc2_status_qa", Command.INF, dst=BROADCAST)
+    assert table.resolve(inf) is tr
+    assert tr.answer is inf
+    assert len(table) == 1
+    assert table.resolve(answer("boiler_temp")) is qur
+
+
+def test_same_key_in_order():
+    table = TransactionTable(window=3)
+    trs = [send(table, "boiler_temp") for _ in range(3)]
+    assert table.full
+    assert [table.resolve(answer("boiler_temp")) for _ in range(3)] == trs
+    assert len(table) == 0
+
+
+def test_expire():
+    table = TransactionTable(window=3, timeout=1.0)
+    first = send(table, "boiler_temp")
+    table.timeout = 5.0
+    second = send(table, "boiler_temp")
+    other = send(table, "flue_temp")
+    assert table.next_deadline() == first.deadline
+
+    assert table.expire(first.deadline - 0.5) == []
+    assert table.expire(first.deadline) == [first]
+    assert first.answer is None and first.answered > 0
+    assert len(table) == 2
+    assert table.next_deadline() == min(second.deadline, other.deadline)
+
+    # The next one of the key gets the answer
+    ans = answer("boiler_temp")
+    assert table.resolve(ans) is second
+
+    assert table.expire(other.deadline + 1) == [other]
+    assert len(table) == 0 and table.next_deadline() is None